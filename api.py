@@ -0,0 +1,334 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import zlib
+
+import numpy as np
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from bulk import FORMATS as BULK_FORMATS, stream_pricing
+from calculations import break_funding_breakdown
+from charts import FORMATS as CHART_FORMATS, render_cashflow_chart, render_scenario_heatmap
+from loan_inputs import FIELDS, normalize_loan, normalize_prepayment_mode
+from metrics import record_error
+from portfolio import error_code, price_portfolio
+from ppt_export import PPTX_MIMETYPE, portfolio_deck
+from principal_tables import extract_principal_table, read_principal_csv, read_principal_json
+from risk import loan_risk
+from scenarios import DEFAULT_NUM_DATES, prepayment_grid
+
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+MAX_BATCH_LOANS = int(os.getenv("API_MAX_BATCH_LOANS", 1000))
+MAX_DECK_LOANS = int(os.getenv("API_MAX_DECK_LOANS", 5000))
+MAX_DECK_CHARTS = 50  # each chart is a full Matplotlib render
+# A scenario grid holds dates x amounts x periods floats
+MAX_SCENARIO_DATES = 120
+MAX_SCENARIO_AMOUNTS = 20
+GZIP_MIN_BYTES = 1024  # smaller bodies are not worth compressing
+GZIP_LEVEL = 6
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def read_json():
+    """
+    Request body as JSON, transparently gunzipping `Content-Encoding: gzip`.
+    """
+    body = request.get_data(cache=False)
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        try:
+            body = gzip.decompress(body)
+        except (OSError, EOFError):
+            raise BadRequest("Body is not valid gzip.")
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise BadRequest("Body is not valid JSON.")
+
+
+def accepts_gzip():
+    return 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+
+def gzip_chunks(chunks):
+    """
+    Incrementally gzip a stream of text chunks.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def wants_detail():
+    return request.args.get('detail', '1').lower() not in ('0', 'false', 'no')
+
+
+def price_loan(values, detail=True):
+    """
+    Price one loan object. Returns (response body, HTTP status).
+    """
+    if not isinstance(values, dict):
+        return {'error': "Each loan must be a JSON object.", 'code': 'invalid_request'}, 400
+
+    data, errors = normalize_loan(values)
+    if errors:
+        return {'error': "Invalid loan inputs.", 'code': 'invalid_input', 'fields': errors}, 400
+
+    try:
+        result = break_funding_breakdown(data)
+    except (ValueError, NotImplementedError) as e:
+        return {'error': str(e), 'code': error_code(e)}, 422
+
+    if not detail:
+        return {'break_funding_cost': result['break_funding_cost']}, 200
+    return {'inputs': data, **result}, 200
+
+
+@api.errorhandler(BadRequest)
+def bad_request(e):
+    return jsonify({'error': str(e), 'code': 'invalid_request'}), 400
+
+
+@api.route('/break-funding', methods=['POST'])
+def break_funding():
+    """
+    Price one loan given as a JSON object with the form's fields. Responds
+    with the cost, both schedules and the discount factors; ?detail=0 returns
+    the cost only.
+    """
+    body, status = price_loan(read_json(), wants_detail())
+    return jsonify(body), status
+
+
+@api.route('/break-funding/batch', methods=['POST'])
+def break_funding_batch():
+    """
+    Price a list of loans ({"loans": [...]} or a bare array). Each result
+    carries the loan's "id" (or its index) and either the pricing or an
+    error, so one bad loan does not fail the batch.
+    """
+    payload = read_json()
+    loans = payload.get('loans') if isinstance(payload, dict) else payload
+    if not isinstance(loans, list):
+        raise BadRequest("Expected a list of loans.")
+    if len(loans) > MAX_BATCH_LOANS:
+        raise BadRequest(f"At most {MAX_BATCH_LOANS} loans per batch.")
+
+    detail = wants_detail()
+    results = []
+    failed = 0
+    for index, loan in enumerate(loans):
+        body, status = price_loan(loan, detail)
+        loan_id = loan.get('id', index) if isinstance(loan, dict) else index
+        results.append({'id': loan_id, 'status': status, **body})
+        failed += status != 200
+    return jsonify({'count': len(results), 'failed': failed, 'results': results})
+
+
+@api.route('/break-funding/deck', methods=['POST'])
+def break_funding_deck():
+    """
+    PowerPoint deck with one slide per loan ({"loans": [...]} or a bare
+    array), priced in one pass by price_portfolio. Loans that fail get a
+    slide with their error code. ?charts=1 adds each loan's cashflow chart
+    (at most MAX_DECK_CHARTS loans).
+    """
+    payload = read_json()
+    loans = payload.get('loans') if isinstance(payload, dict) else payload
+    if not isinstance(loans, list) or not all(isinstance(loan, dict) for loan in loans):
+        raise BadRequest("Expected a list of loan objects.")
+    if len(loans) > MAX_DECK_LOANS:
+        raise BadRequest(f"At most {MAX_DECK_LOANS} loans per deck.")
+    try:
+        results = price_portfolio(loans)
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+    charts = {}
+    if request.args.get('charts', '0').lower() in ('1', 'true', 'yes'):
+        if len(loans) > MAX_DECK_CHARTS:
+            raise BadRequest(f"Charts are limited to decks of {MAX_DECK_CHARTS} loans.")
+        for index, (loan, error) in enumerate(zip(loans, results['error'])):
+            if error:
+                continue
+            try:
+                charts[index] = render_cashflow_chart(loan)
+            except Exception:
+                # The slide is still built, just without its chart
+                record_error('deck_chart')
+
+    response = Response(portfolio_deck(loans, results, charts), mimetype=PPTX_MIMETYPE)
+    response.headers['Content-Disposition'] = 'attachment; filename=break_funding_portfolio.pptx'
+    return response
+
+
+@api.route('/break-funding/risk', methods=['POST'])
+def break_funding_risk():
+    """
+    Cost of one loan with its DV01 and key-rate deltas (cost change per +1bp
+    zero-rate shift). Optional "key_tenors" (years) override the curve's
+    pillars.
+    """
+    payload = read_json()
+    if not isinstance(payload, dict):
+        raise BadRequest("Expected a JSON object.")
+    data, errors = normalize_loan(payload)
+    if errors:
+        return jsonify({'error': "Invalid loan inputs.", 'code': 'invalid_input', 'fields': errors}), 400
+    try:
+        key_tenors = payload.get('key_tenors')
+        if key_tenors is not None:
+            key_tenors = sorted(float(t) for t in key_tenors)
+        result = loan_risk(data, key_tenors=key_tenors)
+    except (TypeError, ValueError, NotImplementedError) as e:
+        return jsonify({'error': str(e), 'code': error_code(e)}), 422
+    return jsonify({'inputs': data, **result})
+
+
+@api.route('/break-funding/scenarios', methods=['POST'])
+def break_funding_scenarios():
+    """
+    Cost matrix over prepayment dates x amounts for one loan. The body holds
+    the loan terms plus optional "dates" (or "num_dates" periods from
+    "prepayment_date") and "fractions" of outstanding principal or fixed
+    "amounts". ?format=png|svg returns the heatmap instead of JSON.
+
+    At most MAX_SCENARIO_DATES dates and MAX_SCENARIO_AMOUNTS amounts or
+    fractions per grid. Every cell is priced in backload mode; another
+    "prepayment_mode" is rejected rather than ignored.
+    """
+    payload = read_json()
+    if not isinstance(payload, dict):
+        raise BadRequest("Expected a JSON object.")
+    for key, limit in (('dates', MAX_SCENARIO_DATES), ('fractions', MAX_SCENARIO_AMOUNTS),
+                       ('amounts', MAX_SCENARIO_AMOUNTS)):
+        values = payload.get(key)
+        if values is not None and (not isinstance(values, list) or len(values) > limit):
+            raise BadRequest(f"'{key}' must be a list of at most {limit} values.")
+    try:
+        num_dates = int(payload.get('num_dates', DEFAULT_NUM_DATES))
+    except (TypeError, ValueError):
+        raise BadRequest("'num_dates' must be a whole number.")
+    if not 0 < num_dates <= MAX_SCENARIO_DATES:
+        raise BadRequest(f"'num_dates' must be between 1 and {MAX_SCENARIO_DATES}.")
+    mode = payload.get('prepayment_mode')
+    if mode not in (None, '') and normalize_prepayment_mode(str(mode)) != 'backload':
+        return jsonify({'error': "Scenario grids are priced in backload mode only.",
+                        'code': 'invalid_prepayment_mode'}), 422
+    fields = FIELDS + (['prepayment_date'] if payload.get('prepayment_date') else [])
+    data, errors = normalize_loan(payload, fields)
+    if errors:
+        return jsonify({'error': "Invalid loan inputs.", 'code': 'invalid_input', 'fields': errors}), 400
+
+    try:
+        grid = prepayment_grid(
+            data,
+            prepayment_dates=payload.get('dates'),
+            fractions=payload.get('fractions'),
+            amounts=payload.get('amounts'),
+            num_dates=num_dates,
+        )
+    except (TypeError, ValueError, NotImplementedError) as e:
+        return jsonify({'error': str(e), 'code': error_code(e)}), 422
+
+    fmt = request.args.get('format', 'json')
+    if fmt in CHART_FORMATS:
+        return Response(render_scenario_heatmap(grid, fmt=fmt), mimetype=CHART_FORMATS[fmt])
+    return jsonify({
+        'inputs': data,
+        'prepayment_dates': np.datetime_as_string(grid.prepayment_dates, unit='D').tolist(),
+        'labels': grid.labels,
+        'outstanding': grid.outstanding.tolist(),
+        'amounts': grid.amounts.tolist(),
+        # NaN (amount above outstanding principal) is not valid JSON
+        'costs': [[None if np.isnan(c) else c for c in row] for row in grid.costs.tolist()],
+    })
+
+
+@api.route('/custom-schedule', methods=['POST'])
+def custom_schedule():
+    """
+    Read a principal schedule from an uploaded "file" (.csv, .json or a .pdf
+    term sheet) and return it in the form pricing accepts as
+    "custom_principal".
+    """
+    upload = request.files.get('file')
+    name = upload.filename.lower() if upload and upload.filename else ''
+    if not name.endswith(('.csv', '.json', '.pdf')):
+        raise BadRequest("Upload a CSV, JSON or PDF schedule as 'file'.")
+    try:
+        if name.endswith('.pdf'):
+            with tempfile.NamedTemporaryFile(suffix='.pdf') as f:
+                upload.save(f)
+                f.flush()
+                schedule = extract_principal_table(f.name)
+        elif name.endswith('.json'):
+            schedule = read_principal_json(upload.read())
+        else:
+            schedule = read_principal_csv(upload.read().decode('utf-8-sig'))
+        amounts = [row['principal'] if isinstance(row, dict) else row for row in schedule]
+        total = round(sum(float(a) for a in amounts), 2)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f"Unreadable principal schedule: {e}", 'code': 'invalid_custom_schedule'}), 422
+    if not schedule:
+        return jsonify({'error': "No principal schedule found.", 'code': 'invalid_custom_schedule'}), 422
+
+    return jsonify({'schedule': schedule, 'count': len(schedule), 'total': total})
+
+
+@api.route('/break-funding/stream', methods=['POST'])
+def break_funding_stream():
+    """
+    Price a CSV or NDJSON loan file line by line and stream the results back
+    (chunked) as they are priced, so neither the upload nor the results are
+    held in memory. The input format comes from ?input= or the Content-Type;
+    the result format from ?format= (default: same as the input).
+    """
+    input_format = request.args.get('input') or ('ndjson' if 'json' in request.mimetype else 'csv')
+    output_format = request.args.get('format', input_format)
+    if input_format not in BULK_FORMATS or output_format not in BULK_FORMATS:
+        raise BadRequest(f"Formats must be one of: {', '.join(BULK_FORMATS)}.")
+
+    body = request.stream
+    if not isinstance(body, io.BufferedIOBase):
+        body = io.BufferedReader(body)
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        body = gzip.GzipFile(fileobj=body, mode='rb')
+    lines = io.TextIOWrapper(body, encoding='utf-8', newline='')
+
+    chunks = stream_pricing(lines, input_format, output_format)
+    response = Response(mimetype=BULK_FORMATS[output_format])
+    if accepts_gzip():
+        chunks = gzip_chunks(chunks)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+    response.response = stream_with_context(chunks)
+    return response
+
+
+@api.after_request
+def gzip_response(response):
+    """
+    Gzip JSON responses for clients that accept it.
+    """
+    if (response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not accepts_gzip()):
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
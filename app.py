@@ -1,98 +1,79 @@
 import os
-import re
-from dateutil import parser
+import uuid
 
 from flask import Flask, request, render_template
-from flask import send_file
+from flask import jsonify, send_file, url_for
+from werkzeug.datastructures import FileStorage
 from io import BytesIO
-from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.shapes import MSO_AUTO_SHAPE_TYPE
-from pptx.dml.color import RGBColor
 
-from calculations import generate_cashflow_plot, compute_break_funding_cost
+from api import api
+from calculations import break_funding_breakdown
+from charts import (
+    CHART_MODE, EXPORT_DPI, FORMATS, WEB_DPI, cashflow_chart_json, render_cashflow_chart,
+)
 from extract_from_pdf import extract_loan_terms, chat_reply
+from jobs import JobQueue
+import metrics
+from metrics import record_error, stage
+from loan_inputs import (
+    FIELDS, normalize_amortization_type, normalize_date, normalize_frequency, parse_amount, safe_field,
+)
+from ppt_export import PPTX_MIMETYPE, loan_deck
+from principal_tables import extract_principal_table
+from result_store import result_store
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.register_blueprint(api)
+metrics.init_app(app)
 
-FIELDS = [
-    'effective_date', 'maturity_date', 'frequency', 'amortization_type',
-    'loan_rate', 'balance'
-]
+job_queue = JobQueue()
 
-def safe_field(field_name, extracted, form):
+
+def prefill_from_extraction(extracted, form):
     """
-    The safe_field() function is a helper that prioritizes user input, but falls back 
-    to extracted values (like from a PDF), and if neither is available, returns a 
-    blank string.
+    Form values for a freshly extracted term sheet. Prepayment defaults to
+    the effective date and half the balance when those are known.
     """
-    user_val = form.get(field_name)
-    extracted_val = extracted.get(field_name, "")
-    if user_val is not None and user_val.strip() != "":
-        return user_val.strip()
-    elif extracted_val not in (None, "", "None"):
-        return extracted_val
-    else:
-        return ""
+    # Pre-fill fields with extracted values (if found), else blank
+    data = {field: extracted.get(field, '') for field in FIELDS}
 
-def normalize_date(date_str):
-    try:
-        dt = parser.parse(date_str)
-        return dt.strftime("%Y-%m-%d")
-    except Exception:
-        return ""
-
-def normalize_frequency(freq_str):
-    freq_str = freq_str.strip().lower()
-    mapping = {
-        'monthly': 'monthly',
-        'month': 'monthly',
-        'quarterly': 'quarterly',
-        'quarter': 'quarterly',
-        '3m': 'quarterly',
-        'semiannual': 'semiannual',
-        'semi-annually': 'semiannual',
-        '6m': 'semiannual',
-        'annual': 'annual',
-        'yearly': 'annual',
-        '12m': 'annual'
-    }
-    return mapping.get(freq_str, '')
-
-def normalize_amortization_type(amt_str):
-    amt_str = amt_str.strip().lower()
-    mapping = {
-        'interest only': 'interest only',
-        'io': 'interest only',
-        'i/o': 'interest only',
-
-        'equal': 'equal',
-        'equal payment': 'equal',
-        'annuity': 'equal',
-        'level payment': 'equal',
-
-        'linear': 'linear',
-        'straight line': 'linear',
-        'even principal': 'linear',
-        'constant principal': 'linear',
-
-        'custom': 'custom',
-        'manual': 'custom',
-        'user defined': 'custom',
-    }
-    return mapping.get(amt_str, '')
-
-
-# Normalize/parse balance as float (handle commas, $ signs)
-def parse_amount(s):
-    if not s:
-        return None
-    s = re.sub(r'[^\d.]', '', s)
+    effective_date = normalize_date(extracted.get('effective_date', ''))
+    balance = parse_amount(extracted.get('balance', ''))
+
+    data['prepayment_date'] = effective_date
+    data['prepayment_amount'] = float(balance / 2) if balance else ''
+
+    data['effective_date'] = effective_date
+    data['maturity_date'] = normalize_date(extracted.get('maturity_date', ''))
+    data['frequency'] = normalize_frequency(safe_field('frequency', extracted, form))
+    data['amortization_type'] = normalize_amortization_type(safe_field('amortization_type', extracted, form))
+    return data
+
+
+def run_upload_job(path, filename, progress):
+    """
+    Background extraction for an uploaded PDF spooled to `path`. Custom
+    amortization term sheets also get their repayment table, if one is found.
+    """
     try:
-        return float(s)
-    except ValueError:
-        return None
+        with open(path, 'rb') as f:
+            extracted, quotes = extract_loan_terms(FileStorage(stream=f, filename=filename), progress=progress)
+        fields = prefill_from_extraction(extracted, {})
+        result = {'fields': fields, 'quotes': quotes}
+        if fields['amortization_type'] == 'custom':
+            try:
+                result['custom_principal'] = extract_principal_table(path)
+            except ValueError as e:
+                result['custom_principal_error'] = str(e)
+    finally:
+        os.remove(path)
+    return result
+
+
+def render_index(**context):
+    with stage('render_template'):
+        return render_template('index.html', chart_mode=CHART_MODE, **context)
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -104,6 +85,7 @@ def index():
     break_funding_cost = None
     error_message = None
     response_text=None
+    calc_id = None
 
     if request.method == 'POST':
         action = request.form.get('action')  # Check whether it's 'upload' or 'calculate'
@@ -112,34 +94,12 @@ def index():
             # Only handle PDF upload and pre-fill the form
             pdf_file = request.files.get('pdf')
             if pdf_file and pdf_file.filename.endswith('.pdf'):
-                extracted, extracted_quotes = extract_loan_terms(pdf_file)
-
-            # Pre-fill fields with extracted values (if found), else blank
-            for field in FIELDS:
-                data[field] = extracted.get(field, '')
+                with stage('extract'):
+                    extracted, extracted_quotes = extract_loan_terms(pdf_file)
 
-            # Extracted values from the PDF or user input
-            effective_date = normalize_date(extracted.get('effective_date', ''))
-            balance = parse_amount(extracted.get('balance', ''))
+            data = prefill_from_extraction(extracted, request.form)
 
-            # Set Prepayment Date default to Effective Date if missing
-            if effective_date != "":
-                prepayment_date = effective_date
-
-            # Set Prepayment Amount default to half Balance if missing and Balance is valid
-            if balance != "":
-                prepayment_amount = float(balance / 2)
-
-            # Leave prepayment fields empty
-            data['prepayment_date'] = prepayment_date or ''
-            data['prepayment_amount'] = prepayment_amount or ''
-
-            data['effective_date'] = effective_date
-            data['maturity_date'] = normalize_date(extracted.get('maturity_date', ''))
-            data['frequency'] = normalize_frequency(safe_field('frequency', extracted, request.form))
-            data['amortization_type'] = normalize_amortization_type(safe_field('amortization_type', extracted, request.form))
-
-            return render_template('index.html', **data,
+            return render_index(**data,
                                 extracted_quotes=extracted_quotes,
                                 plot_generated=False,
                                 error_message=None,
@@ -169,30 +129,35 @@ def index():
                     data['prepayment_amount'] = float(data['prepayment_amount'])
                 except ValueError:
                     error_message = "Please enter valid numeric values."
-                    return render_template("index.html", **data,
-                                           extracted_quotes=extracted_quotes,
-                                           plot_generated=False,
-                                           error_message=error_message,
-                                           break_funding_cost=None,
-                                           loading=False,
-                                           response_text=None)
+                    return render_index(**data,
+                                        extracted_quotes=extracted_quotes,
+                                        plot_generated=False,
+                                        error_message=error_message,
+                                        break_funding_cost=None,
+                                        loading=False,
+                                        response_text=None)
                 try:
-                    generate_cashflow_plot(data)
-                    break_funding_cost = compute_break_funding_cost(**data)
+                    # The chart itself is rendered (and stored) by /chart.png
+                    with stage('pricing'):
+                        breakdown = break_funding_breakdown(data)
+                    break_funding_cost = breakdown['break_funding_cost']
+                    calc_id = result_store.put({'inputs': data, **breakdown})
                     plot_generated = True
                 except Exception as e:
+                    record_error('pricing')
                     error_message = f"Error generating plot: {e}"
 
             else:
                 error_message = "Please fill in all required fields."
 
-            return render_template('index.html', **data,
-                                   extracted_quotes=extracted_quotes,
-                                   plot_generated=plot_generated,
-                                   error_message=error_message,
-                                   break_funding_cost=break_funding_cost,
-                                   loading=False,
-                                   response_text=None)
+            return render_index(**data,
+                                extracted_quotes=extracted_quotes,
+                                plot_generated=plot_generated,
+                                error_message=error_message,
+                                break_funding_cost=break_funding_cost,
+                                calc_id=calc_id,
+                                loading=False,
+                                response_text=None)
         elif action == 'download_ppt':
             for field in FIELDS:
                 data[field] = request.form.get(field, '').strip()
@@ -232,129 +197,162 @@ def index():
             except (TypeError, ValueError):
                 break_funding_cost = None
 
+            # Prefer the stored result over the hidden fields when it is still there
+            calc_id = request.form.get('calc_id')
+            stored = result_store.get(calc_id)
+            if stored is not None:
+                break_funding_cost = stored['break_funding_cost']
+            else:
+                calc_id = None
+
             # LLM response only
             user_input = request.form.get('user_input', '')
             response_text = None
             if user_input.strip():
                 try:
-                    response_text = chat_reply(user_input, break_funding_cost)
+                    with stage('chat'):
+                        response_text = chat_reply(user_input, break_funding_cost)
                 except Exception as e:
+                    record_error('chat')
                     error_message = f"LLM Error: {e}"
 
-            return render_template('index.html', **data,
+            return render_index(**data,
                                 extracted_quotes=extracted_quotes,
                                 plot_generated=plot_generated,
                                 break_funding_cost=break_funding_cost,
+                                calc_id=calc_id,
                                 error_message=error_message,
                                 response_text=response_text,
                                 loading=False)
 
 
     # GET request
-    return render_template("index.html",
-                           effective_date='',
-                           maturity_date='',
-                           frequency='',
-                           amortization_type='',
-                           loan_rate='',
-                           balance='',
-                           prepayment_date='',
-                           prepayment_amount='',
-                           extracted_quotes={},
-                           plot_generated=False,
-                           break_funding_cost=None,
-                           error_message=None,
-                           loading=False,
-                           response_text=None)
+    return render_index(effective_date='',
+                        maturity_date='',
+                        frequency='',
+                        amortization_type='',
+                        loan_rate='',
+                        balance='',
+                        prepayment_date='',
+                        prepayment_amount='',
+                        extracted_quotes={},
+                        plot_generated=False,
+                        break_funding_cost=None,
+                        error_message=None,
+                        loading=False,
+                        response_text=None)
 
 
 @app.route('/download_ppt', methods=['POST'])
 def download_ppt():
-    # 1. Create presentation
-    prs = Presentation()
-    blank_slide_layout = prs.slide_layouts[6]  # Blank layout
-    slide = prs.slides.add_slide(blank_slide_layout)
-
-    # 2. Add title
-    title_box = slide.shapes.add_textbox(Inches(0.5), Inches(0.3), Inches(8), Inches(1))
-    title_tf = title_box.text_frame
-    title_p = title_tf.paragraphs[0]
-    title_run = title_p.add_run()
-    title_run.text = "Break-Funding Analysis"
-    title_run.font.size = Pt(32)
-    title_run.font.bold = True
-    title_run.font.color.rgb = RGBColor(0, 0, 0)
-
-    # 3. Add subtitle
-    subtitle_box = slide.shapes.add_textbox(Inches(0.5), Inches(1), Inches(9), Inches(0.5))
-    subtitle_tf = subtitle_box.text_frame
-    subtitle_p = subtitle_tf.paragraphs[0]
-    subtitle_run = subtitle_p.add_run()
-    subtitle_run.text = "The following summarizes key loan details:"
-    subtitle_run.font.size = Pt(20)
-    subtitle_run.font.bold = True
-    subtitle_run.font.color.rgb = RGBColor(0, 112, 192)  # Bank of America Blue
-
-    # 4. Add loan details (bullets)
-    loan_textbox = slide.shapes.add_textbox(Inches(0.5), Inches(1.4), Inches(4.5), Inches(2))
-    loan_tf = loan_textbox.text_frame
-    loan_tf.clear()
-
-    bullet_items = [
-        ("Effective Date", request.form.get('effective_date', '')),
-        ("Maturity Date", request.form.get('maturity_date', '')),
-        ("Loan Rate", f"{request.form.get('loan_rate', '')}%"),
-        ("Balance", f"${request.form.get('balance', '')}"),
-    ]
-
-    for label, value in bullet_items:
-        p = loan_tf.add_paragraph()
-        run = p.add_run()
-        run.text = f"{label}: {value}"
-        run.font.size = Pt(18)
-        run.font.color.rgb = RGBColor(0, 0, 0)
-        p.level = 0
-
-    # 5. Break Funding Cost
-    break_cost = request.form.get('break_funding_cost')
-    if break_cost:
-        cost_box = slide.shapes.add_textbox(Inches(0.5), Inches(3.2), Inches(6), Inches(0.5))
-        cost_tf = cost_box.text_frame
-        cost_tf.clear()
-        p = cost_tf.paragraphs[0]
-        run = p.add_run()
-        run.text = f"Break-Funding Cost: ${float(break_cost):,.2f}"
-        run.font.size = Pt(20)
-        run.font.bold = True
-        run.font.color.rgb = RGBColor(0, 0, 0)
-
-    # 6. Add chart image (bottom)
-    img_path = "static/plot.png"
-    img_height = Inches(3.5)
-    img_width = Inches(7)
-    img_top = prs.slide_height - img_height - Inches(0.3)
-    img_left = (prs.slide_width - img_width) / 2
-    slide.shapes.add_picture(img_path, img_left, img_top, width=img_width, height=img_height)
-
-    # 7. Add logo (top-right)
-    logo_path = "static/logo.png"
-    logo_width = Inches(1.5)
-    logo_top = Inches(0.2)
-    logo_left = prs.slide_width - logo_width - Inches(0.3)
-    slide.shapes.add_picture(logo_path, logo_left, logo_top, width=logo_width)
-
-    # 8. Save presentation to memory
-    ppt_io = BytesIO()
-    prs.save(ppt_io)
-    ppt_io.seek(0)
+    """
+    One-slide deck for a calculation. With a known calc_id the stored inputs,
+    cost and export chart are reused; otherwise the loan in the form is used
+    and its chart rendered from this request's inputs (not a shared plot file).
+    """
+    calc_id = request.form.get('calc_id')
+    stored = result_store.get(calc_id)
+    if stored is not None:
+        loan, break_cost = stored['inputs'], stored['break_funding_cost']
+        with stage('chart'):
+            chart_png = result_store.chart(calc_id, f'png@{EXPORT_DPI}',
+                                           lambda: render_cashflow_chart(loan, dpi=EXPORT_DPI))
+    else:
+        loan = request.form
+        try:
+            break_cost = float(request.form.get('break_funding_cost') or '')
+        except ValueError:
+            break_cost = None
+        with stage('chart'):
+            chart_png = render_cashflow_chart(loan, dpi=EXPORT_DPI)
+
+    with stage('ppt_build'):
+        ppt = loan_deck(loan, break_cost, chart_png)
 
     return send_file(
-        ppt_io,
-        mimetype='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        BytesIO(ppt),
+        mimetype=PPTX_MIMETYPE,
         as_attachment=True,
         download_name='break_funding_analysis.pptx'
     )
 
+@app.route('/jobs/upload', methods=['POST'])
+def start_upload_job():
+    """
+    Accept a PDF and extract its terms in the background.
+    Responds immediately with a job id to poll at /jobs/<job_id>.
+    """
+    pdf_file = request.files.get('pdf')
+    if not pdf_file or not pdf_file.filename.endswith('.pdf'):
+        return jsonify({'error': "Please upload a PDF file."}), 400
+
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}.pdf")
+    pdf_file.save(path)
+
+    job_id = job_queue.submit('upload', run_upload_job, path, pdf_file.filename)
+    return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.status(job_id)
+    if job is None:
+        return jsonify({'error': "Unknown job."}), 404
+    return jsonify(job)
+
+
+@app.route('/chart.json', methods=['GET'])
+def cashflow_chart_data():
+    """
+    Dates and stacked principal/interest series for the page to draw the
+    cashflow chart itself: a few kilobytes of JSON instead of a Matplotlib
+    render. Looked up by ?calc_id= like /chart.<fmt>, else from the query string.
+    """
+    calc_id = request.args.get('calc_id')
+    stored = result_store.get(calc_id)
+    try:
+        with stage('chart_data'):
+            if stored is not None:
+                payload = result_store.chart(calc_id, 'json', lambda: cashflow_chart_json(stored['inputs']))
+            else:
+                payload = cashflow_chart_json(request.args)
+    except Exception as e:
+        record_error('chart_data')
+        return jsonify({'error': f"Error generating chart data: {e}"}), 400
+
+    response = app.response_class(payload, mimetype='application/json')
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+@app.route('/chart.<fmt>', methods=['GET'])
+def cashflow_chart(fmt):
+    """
+    Render the cashflow chart for the calculation in ?calc_id=, or for the
+    loan described by the query string when that id is unknown to this
+    worker's store. Either way repeat requests are served without rendering.
+    """
+    if fmt not in FORMATS:
+        return "Unsupported chart format", 404
+    calc_id = request.args.get('calc_id')
+    stored = result_store.get(calc_id)
+    try:
+        with stage('chart'):
+            if stored is not None:
+                chart = result_store.chart(calc_id, f'{fmt}@{WEB_DPI}',
+                                           lambda: render_cashflow_chart(stored['inputs'], fmt=fmt))
+            else:
+                chart = render_cashflow_chart(request.args, fmt=fmt)
+    except Exception as e:
+        record_error('chart')
+        return f"Error generating plot: {e}", 400
+
+    response = send_file(BytesIO(chart), mimetype=FORMATS[fmt])
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
 if __name__ == '__main__':
     # port = int(os.environ.get("PORT", 5000))
     # app.run(debug=True, host='0.0.0.0', port=port)
@@ -0,0 +1,336 @@
+"""
+Latency and peak-memory benchmarks for pricing, plotting, PDF extraction and
+PPT export, checked against recorded baselines:
+
+    python benchmarks.py                      # run everything, compare to the baseline
+    python benchmarks.py -k pricing -k plot   # only benchmarks whose name contains a filter
+    python benchmarks.py --record             # (re)write the baseline after an intended change
+
+Loans are synthetic (every frequency and amortization type, tenors up to 40
+years), term sheets are generated multi-page PDFs, and the model is the local
+llm_stub_server, so runs need no network and are repeatable. Caches are
+cleared before every run, so timings are cold-path costs. The exit status is
+1 when a benchmark is slower or uses more memory than its baseline allows.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fitz  # PyMuPDF
+import numpy as np
+from werkzeug.datastructures import FileStorage
+
+from calculations import compute_break_funding_cost, generate_cashflow_plot, schedule_cache
+from charts import cashflow_chart_json, render_cache, render_cashflow_chart
+from curves import default_curve
+from schedule import FREQ_MONTHS, _cached_payment_dates
+
+
+BASELINE_PATH = os.getenv(
+    "BENCHMARK_BASELINE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'benchmark_baseline.json'),
+)
+TIME_TOLERANCE = 0.25    # allowed slowdown of the median, as a fraction
+MEMORY_TOLERANCE = 0.25  # allowed growth of peak traced memory
+MIN_DELTA_MS = 2.0       # slowdowns smaller than this are timer noise
+
+TENORS = (1, 5, 10, 20, 40)  # years
+TERM_SHEET_PAGES = 40
+
+# What the stub model answers for the fields the rules leave open
+STUB_FIELDS = [
+    {"key": "Frequency", "value": "quarterly", "quote": "Interest is paid every three months."},
+    {"key": "Amortization Type", "value": "equal", "quote": "Level payments of principal and interest."},
+]
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Register `setup(workdir)` as benchmark `name`. setup prepares inputs
+    outside the timed region and returns the zero-argument callable to time.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def synthetic_loans(frequencies=tuple(FREQ_MONTHS), amortizations=('interest only', 'equal', 'linear'),
+                    tenors=TENORS, seed=0):
+    """
+    One loan per (frequency, amortization type, tenor), as keyword arguments
+    for compute_break_funding_cost. Rates, balances and prepayments are drawn
+    from a seeded generator so every run prices the same book. Prepayments
+    fall on a payment date in the first 40% of the term and never exceed 30%
+    of the balance, so they always fit the outstanding principal.
+    """
+    rng = np.random.default_rng(seed)
+    effective = datetime.date(2025, 1, 15)
+    loans = []
+    for frequency in frequencies:
+        for amortization in amortizations:
+            for years in tenors:
+                step = FREQ_MONTHS[frequency]
+                prepay_period = int(rng.integers(0, max(years * 12 // step * 2 // 5, 1)))
+                year, month = divmod(effective.month - 1 + prepay_period * step, 12)
+                balance = float(rng.integers(10, 5000)) * 10000
+                loans.append({
+                    'effective_date': effective.isoformat(),
+                    'maturity_date': effective.replace(year=effective.year + years).isoformat(),
+                    'frequency': frequency,
+                    'amortization_type': amortization,
+                    'loan_rate': round(float(rng.uniform(1, 9)), 2),
+                    'balance': balance,
+                    'prepayment_date': effective.replace(year=effective.year + year, month=month + 1).isoformat(),
+                    'prepayment_amount': round(balance * float(rng.uniform(0.05, 0.3)), 2),
+                })
+    return loans
+
+
+def longest_loan():
+    return synthetic_loans(('monthly',), ('equal',), (max(TENORS),))[0]
+
+
+def synthetic_term_sheet(path, pages=TERM_SHEET_PAGES):
+    """
+    Write a term sheet PDF: the key terms on the first page, then `pages - 1`
+    pages of legal boilerplate. Frequency and amortization are left for the
+    model so extraction reads every page and makes one model call.
+    """
+    terms = (
+        "INDICATIVE TERM SHEET\n\n"
+        "Borrower: Example Holdings Ltd\n"
+        "Effective Date: 15 January 2025\n"
+        "Maturity Date: 15 January 2035\n"
+        "Loan Amount: USD 25,000,000\n"
+        "Interest Rate: 4.75% per annum\n"
+    )
+    boilerplate = (
+        "The Borrower shall indemnify each Finance Party against any cost, loss or liability "
+        "incurred by that Finance Party as a result of the occurrence of any Event of Default "
+        "or a failure by an Obligor to pay any amount due under a Finance Document on its due date. "
+    ) * 12
+    with fitz.open() as doc:
+        for number in range(pages):
+            page = doc.new_page()
+            text = terms if number == 0 else f"Clause {number}\n\n{boilerplate}"
+            page.insert_textbox(fitz.Rect(54, 54, page.rect.width - 54, page.rect.height - 54), text, fontsize=9)
+        doc.save(path)
+    return path
+
+
+def reset_caches():
+    """
+    Empty the in-process caches so each run measures the cold path.
+    """
+    schedule_cache.clear()
+    render_cache.clear()
+    _cached_payment_dates.cache_clear()
+    default_curve().clear_cache()
+
+
+@benchmark('pricing_book')
+def bench_pricing_book(workdir):
+    loans = synthetic_loans()
+    return lambda: [compute_break_funding_cost(**loan) for loan in loans]
+
+
+@benchmark('pricing_40y_monthly')
+def bench_pricing_longest(workdir):
+    loan = longest_loan()
+    return lambda: compute_break_funding_cost(**loan)
+
+
+@benchmark('plot_40y_monthly')
+def bench_plot(workdir):
+    loan = longest_loan()
+    path = os.path.join(workdir, 'plot.png')
+    return lambda: generate_cashflow_plot(loan, path=path)
+
+
+@benchmark('chart_png_web')
+def bench_chart(workdir):
+    loan = longest_loan()
+    return lambda: render_cashflow_chart(loan)
+
+
+@benchmark('chart_json_web')
+def bench_chart_json(workdir):
+    loan = longest_loan()
+    return lambda: cashflow_chart_json(loan)
+
+
+@benchmark('pdf_text')
+def bench_pdf_text(workdir):
+    from extract_from_pdf import extract_text_from_pdf
+
+    path = synthetic_term_sheet(os.path.join(workdir, 'term_sheet.pdf'))
+
+    def run():
+        with open(path, 'rb') as f:
+            return extract_text_from_pdf(f)
+    return run
+
+
+@benchmark('extract_terms_stub_llm')
+def bench_extract_terms(workdir):
+    import extract_from_pdf
+    from extraction_cache import ExtractionCache
+    from huggingface_hub import InferenceClient
+    from llm_client import LLMGateway
+    from llm_stub_server import start_stub_server
+
+    server, url = start_stub_server(reply=json.dumps(STUB_FIELDS))
+    extract_from_pdf.llm = LLMGateway(InferenceClient(base_url=url, token='stub', timeout=5))
+    cache = ExtractionCache(path=os.path.join(workdir, 'extraction.sqlite3'))
+    extract_from_pdf._extraction_cache = cache
+    path = synthetic_term_sheet(os.path.join(workdir, 'term_sheet.pdf'))
+
+    def run():
+        cache.clear()
+        with open(path, 'rb') as f:
+            extracted, _ = extract_from_pdf.extract_loan_terms(FileStorage(stream=f, filename='term_sheet.pdf'))
+        if extracted.get('frequency') != 'quarterly':
+            raise RuntimeError("Stub model answer was not used")
+        return extracted
+    return run
+
+
+@benchmark('download_ppt')
+def bench_download_ppt(workdir):
+    from app import app
+
+    loan = longest_loan()
+    form = {key: str(value) for key, value in loan.items()}
+    form['break_funding_cost'] = str(compute_break_funding_cost(**loan))
+    client = app.test_client()
+
+    def run():
+        response = client.post('/download_ppt', data=form)
+        if response.status_code != 200:
+            raise RuntimeError(f"download_ppt returned {response.status_code}")
+        return response.data
+    return run
+
+
+@benchmark('portfolio_deck_1000')
+def bench_portfolio_deck(workdir):
+    from portfolio import price_portfolio
+    from ppt_export import portfolio_deck
+
+    book = synthetic_loans()
+    loans = [dict(book[i % len(book)], loan_id=i) for i in range(1000)]
+    results = price_portfolio(loans)
+    return lambda: portfolio_deck(loans, results)
+
+
+def measure(run, repeat):
+    """
+    Median and best wall time over `repeat` cold runs (after one warm-up),
+    plus peak traced memory from one extra run under tracemalloc.
+    """
+    reset_caches()
+    run()
+    times = []
+    for _ in range(repeat):
+        reset_caches()
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+
+    reset_caches()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'median_ms': round(statistics.median(times), 3),
+        'min_ms': round(min(times), 3),
+        'peak_kib': round(peak / 1024, 1),
+        'repeat': repeat,
+    }
+
+
+def regressions(result, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Reasons `result` is worse than `baseline`, empty when within tolerance.
+    """
+    problems = []
+    slower = result['median_ms'] - baseline['median_ms']
+    if slower > max(baseline['median_ms'] * time_tolerance, MIN_DELTA_MS):
+        problems.append(f"median {baseline['median_ms']:.1f} -> {result['median_ms']:.1f} ms")
+    if result['peak_kib'] > baseline['peak_kib'] * (1 + memory_tolerance):
+        problems.append(f"peak {baseline['peak_kib']:.0f} -> {result['peak_kib']:.0f} KiB")
+    return problems
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('benchmarks', {})
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    # Keep entries for benchmarks that were filtered out of this run
+    benchmarks = {**load_baseline(path), **results}
+    with open(path, 'w') as f:
+        json.dump({
+            'recorded': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'benchmarks': dict(sorted(benchmarks.items())),
+        }, f, indent=2)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run latency/memory benchmarks against recorded baselines.")
+    parser.add_argument('-k', dest='filters', action='append', default=[],
+                        help="only run benchmarks whose name contains this (repeatable)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per benchmark (default 3)")
+    parser.add_argument('--record', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if not args.filters or any(f in name for f in args.filters)]
+    baseline = load_baseline(args.baseline)
+    results = {}
+    failed = []
+
+    print(f"{'benchmark':<26}{'median ms':>12}{'min ms':>10}{'peak KiB':>12}  status")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            result = measure(BENCHMARKS[name](workdir), args.repeat)
+            results[name] = result
+            if name not in baseline:
+                status = 'new'
+            else:
+                problems = regressions(result, baseline[name], args.time_tolerance, args.memory_tolerance)
+                status = 'REGRESSED: ' + '; '.join(problems) if problems else 'ok'
+                if problems:
+                    failed.append(name)
+            print(f"{name:<26}{result['median_ms']:>12.1f}{result['min_ms']:>10.1f}{result['peak_kib']:>12.0f}  {status}")
+
+    if args.record:
+        save_baseline(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Streaming bulk pricing for CSV and NDJSON loan files.
+
+Records are read, priced and written one at a time, so memory stays flat no
+matter how large the file is:
+
+    python bulk.py loans.csv -o results.ndjson
+    gunzip -c loans.ndjson.gz | python bulk.py - --input-format ndjson --format csv > results.csv
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import sys
+
+from calculations import compute_break_funding_cost
+from loan_inputs import normalize_loan
+from portfolio import error_code
+
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+RESULT_COLUMNS = ['loan_id', 'break_funding_cost', 'error']
+FLUSH_ROWS = 256  # result lines joined into one write / response chunk
+
+# normalize_loan field errors mapped onto the batch pricer's error codes
+FIELD_ERROR_CODES = {
+    'effective_date': 'invalid_date',
+    'maturity_date': 'invalid_date',
+    'prepayment_date': 'invalid_date',
+    'loan_rate': 'invalid_number',
+    'balance': 'invalid_number',
+    'prepayment_amount': 'invalid_number',
+    'frequency': 'invalid_frequency',
+    'amortization_type': 'invalid_amortization',
+    'prepayment_mode': 'invalid_prepayment_mode',
+    'day_count': 'invalid_day_count',
+    'calendar': 'invalid_calendar',
+    'custom_principal': 'invalid_custom_schedule',
+}
+
+
+def iter_csv_records(lines):
+    """
+    Lazily yield row dicts from an iterable of CSV text lines.
+    """
+    return csv.DictReader(lines)
+
+
+def iter_ndjson_records(lines):
+    """
+    Lazily yield one object per non-blank NDJSON line. Lines that do not parse
+    yield None so the caller can report them in place.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+READERS = {'csv': iter_csv_records, 'ndjson': iter_ndjson_records}
+
+
+def price_record(record, number):
+    """
+    Price one loan record with compute_break_funding_cost.
+    Returns a result dict with 'loan_id', 'break_funding_cost' and 'error'.
+    """
+    if not isinstance(record, dict):
+        return {'loan_id': number, 'break_funding_cost': None, 'error': 'invalid_record'}
+
+    loan_id = record.get('loan_id') or record.get('id') or number
+    data, errors = normalize_loan(record)
+    if errors:
+        field = next(iter(errors))
+        return {'loan_id': loan_id, 'break_funding_cost': None, 'error': FIELD_ERROR_CODES[field]}
+    try:
+        return {'loan_id': loan_id, 'break_funding_cost': compute_break_funding_cost(**data), 'error': ''}
+    except (ValueError, NotImplementedError) as e:
+        return {'loan_id': loan_id, 'break_funding_cost': None, 'error': error_code(e)}
+
+
+def price_records(records):
+    """
+    Lazily price an iterable of records; rows are numbered from 0.
+    """
+    for number, record in enumerate(records):
+        yield price_record(record, number)
+
+
+def format_results(results, fmt):
+    """
+    Lazily encode results as CSV (with a header) or NDJSON text, FLUSH_ROWS
+    results per yielded chunk.
+    """
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(RESULT_COLUMNS)
+
+        def encode(batch):
+            for result in batch:
+                cost = result['break_funding_cost']
+                writer.writerow([result['loan_id'], '' if cost is None else cost, result['error']])
+            text = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return text
+    else:
+        def encode(batch):
+            return ''.join(json.dumps(result) + '\n' for result in batch)
+
+    header_pending = fmt == 'csv'
+    while True:
+        batch = list(itertools.islice(results, FLUSH_ROWS))
+        if not batch and not header_pending:
+            return
+        header_pending = False
+        yield encode(batch)
+
+
+def stream_pricing(lines, input_format, output_format):
+    """
+    Read loan records from text `lines`, price them and yield encoded result
+    chunks. Nothing beyond one chunk of records is held in memory.
+    """
+    return format_results(price_records(READERS[input_format](lines)), output_format)
+
+
+def guess_format(path, default='csv'):
+    for fmt in FORMATS:
+        if path.endswith(f'.{fmt}'):
+            return fmt
+    if path.endswith('.jsonl'):
+        return 'ndjson'
+    return default
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream-price a CSV or NDJSON loan file.")
+    parser.add_argument('input', help="loan file, or - for stdin")
+    parser.add_argument('-o', '--output', default='-', help="result file, or - for stdout (default)")
+    parser.add_argument('--input-format', choices=list(FORMATS), help="default: from the input file name, else csv")
+    parser.add_argument('--format', choices=list(FORMATS), help="result format (default: same as the input)")
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or guess_format(args.input)
+    output_format = args.format or (guess_format(args.output, input_format) if args.output != '-' else input_format)
+
+    source = sys.stdin if args.input == '-' else open(args.input, newline='')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        for chunk in stream_pricing(source, input_format, output_format):
+            target.write(chunk)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,87 +1,95 @@
 import datetime
-from dateutil.relativedelta import relativedelta
 import math
 import numpy as np
 
+from cache import LRUCache, hash_key
+from curves import default_curve
+from metrics import register_cache
+from schedule import build_schedule, parse_date, reamortize
 
-import matplotlib.pyplot as plt
+import matplotlib
+import matplotlib.style
 import matplotlib.ticker as mtick
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+CHART_STYLE = 'ggplot'
+
+NON_FINITE_COST = "Break-funding cost is not a finite number."
+
+
+# Original schedules shared by pricing, plotting and PPT export
+SCHEDULE_CACHE_SIZE = 512
+SCHEDULE_CACHE_TTL = 3600  # seconds
+schedule_cache = LRUCache(max_size=SCHEDULE_CACHE_SIZE, ttl=SCHEDULE_CACHE_TTL)
+register_cache('schedule', schedule_cache.info)
+
+
+def schedule_key(data):
+    """
+    Canonical (dates, frequency, rate, balance, amortization, day count,
+    calendar, custom schedule hash) tuple that fully determines the original
+    schedule.
+    """
+    custom = data.get('custom_principal')
+    return (
+        str(data['effective_date']).strip(),
+        str(data['maturity_date']).strip(),
+        data['frequency'].strip().lower(),
+        float(data['loan_rate']),
+        float(data['balance']),
+        data['amortization_type'].strip().lower(),
+        data.get('day_count') or 'periodic',
+        data.get('calendar') or None,
+        hash_key(_plain(custom)) if custom is not None else None,
+    )
 
 
-def compute_original_cashflow(data):
-    start = datetime.datetime.strptime(data['effective_date'], "%Y-%m-%d")
-    end = datetime.datetime.strptime(data['maturity_date'], "%Y-%m-%d")
-    balance = data['balance']
-    annual_rate = data['loan_rate'] / 100
-    amortization = data['amortization_type'].lower()
-    frequency = data['frequency'].lower()
+def _plain(table):
+    # JSON-friendly copy of a custom schedule (lists, dicts, arrays)
+    if isinstance(table, np.ndarray):
+        return table.tolist()
+    return [dict(row) if isinstance(row, dict) else (list(row) if isinstance(row, (list, tuple)) else row)
+            for row in table]
 
-    freq_map = {
-        'monthly': 1,
-        'quarterly': 3,
-        'semiannual': 6,
-        'annual': 12
-    }
 
-    if frequency not in freq_map:
-        raise ValueError("Invalid frequency")
+def get_schedule(data):
+    """
+    Memoized schedule.build_schedule: each unique set of loan terms is built
+    once and shared (read-only) until evicted by size or TTL.
+    """
+    key = schedule_key(data)
+    return schedule_cache.get_or_compute(key, lambda: _readonly_schedule(key, data.get('custom_principal')))
 
-    months_per_period = freq_map[frequency]
 
-    # Generate payment dates
-    payment_dates = []
-    dt = start
-    while dt < end:
-        payment_dates.append(dt)
-        dt += relativedelta(months=+months_per_period)
-    payment_dates.append(end)
-    num_periods = len(payment_dates) - 1
-
-    period_rate = annual_rate * months_per_period / 12
-
-    principal_vector = []
-    interest_vector = []
-
-    if amortization == "interest only":
-        for i in range(num_periods):
-            interest_payment = balance * period_rate
-            principal_payment = 0.0
-            if i == num_periods - 1:
-                principal_payment = balance
-            interest_vector.append(round(interest_payment, 2))
-            principal_vector.append(round(principal_payment, 2))
-
-    elif amortization == "equal":
-        if period_rate == 0:
-            annuity_payment = balance / num_periods
-        else:
-            annuity_payment = balance * (period_rate / (1 - (1 + period_rate) ** -num_periods))
-        for i in range(num_periods):
-            interest_payment = balance * period_rate
-            principal_payment = annuity_payment - interest_payment
-            interest_vector.append(round(interest_payment, 2))
-            principal_vector.append(round(principal_payment, 2))
-            balance -= principal_payment
-
-    elif amortization == "linear":
-        principal_payment = balance / num_periods
-        for i in range(num_periods):
-            interest_payment = balance * period_rate
-            interest_vector.append(round(interest_payment, 2))
-            principal_vector.append(round(principal_payment, 2))
-            balance -= principal_payment
-
-    elif amortization == "custom":
-        raise NotImplementedError("Custom amortization not yet supported")
-
-    else:
-        raise ValueError("Unknown amortization type")
-
-    return principal_vector, interest_vector
+def _readonly_schedule(key, custom_principal=None):
+    effective_date, maturity_date, frequency, loan_rate, balance, amortization_type, day_count, calendar, _ = key
+    schedule = build_schedule({
+        'effective_date': effective_date,
+        'maturity_date': maturity_date,
+        'frequency': frequency,
+        'loan_rate': loan_rate,
+        'balance': balance,
+        'amortization_type': amortization_type,
+        'day_count': day_count,
+        'calendar': calendar,
+        'custom_principal': custom_principal,
+    })
+    for array in (schedule.payment_dates, schedule.principal, schedule.interest):
+        array.setflags(write=False)
+    return schedule
+
+
+def compute_original_cashflow(data):
+    """
+    List-returning wrapper around the (memoized) schedule engine, kept for
+    callers that expect plain Python floats.
+    """
+    schedule = get_schedule(data)
+    return schedule.principal.tolist(), schedule.interest.tolist()
 
 
 def compute_prepayment_cashflow(data, principal_vector, interest_vector):
-    effective_date = datetime.datetime.strptime(data['effective_date'], "%Y-%m-%d")
     prepayment_date = datetime.datetime.strptime(data['prepayment_date'], "%Y-%m-%d")
     prepayment_amount = data['prepayment_amount']
     frequency = data['frequency'].lower()
@@ -96,22 +104,27 @@ def compute_prepayment_cashflow(data, principal_vector, interest_vector):
     months_per_period = freq_map[frequency]
     num_periods = len(principal_vector)
 
-    # Build period start dates
-    period_dates = []
-    dt = effective_date
-    for _ in range(num_periods):
-        period_dates.append(dt)
-        dt += relativedelta(months=+months_per_period)
+    # Period start dates from the shared (cached) schedule grid
+    period_dates = get_schedule(data).period_starts[:num_periods]
 
     # Find the first period on or after the prepayment date
-    prepay_index = next((i for i, date in enumerate(period_dates) if date >= prepayment_date), None)
-    if prepay_index is None:
+    prepay_index = int(np.searchsorted(period_dates, parse_date(prepayment_date), side='left'))
+    if prepay_index == num_periods:
         raise ValueError("Prepayment date is beyond loan maturity.")
 
     remaining_balance = sum(principal_vector[prepay_index:])
     if prepayment_amount > remaining_balance:
         raise ValueError("Prepayment amount exceeds remaining balance.")
 
+    mode = data.get('prepayment_mode') or 'backload'
+    if mode != 'backload':
+        # Re-amortize from the prepayment period on, recomputing interest
+        # (at the nominal period rate, whatever the schedule's day count)
+        period_rate = float(data['loan_rate']) / 100 * months_per_period / 12
+        principal, interest = reamortize(principal_vector, interest_vector, prepay_index, prepayment_amount,
+                                         period_rate, data['amortization_type'].lower(), mode)
+        return principal.tolist(), interest.tolist()
+
     # Apply prepayment by backloading principal
     updated_principal_vector = principal_vector.copy()
     remaining_prepayment = prepayment_amount
@@ -122,8 +135,41 @@ def compute_prepayment_cashflow(data, principal_vector, interest_vector):
         remaining_prepayment -= reduction
         i -= 1
 
-    return updated_principal_vector, interest_vector  # Interest not recalculated here
+    return updated_principal_vector, interest_vector  # Interest not recalculated when backloading
+
+
+
+def break_funding_cashflows(data, curve=None):
+    """
+    Original and adjusted (principal, interest) vectors plus the discount
+    factors used to price them.
+    """
+    # Step 1: Compute original cashflows
+    original_principal, original_interest = compute_original_cashflow(data)
+
+    # Step 2: Compute adjusted cashflows (after prepayment)
+    adjusted_principal, adjusted_interest = compute_prepayment_cashflow(data, original_principal, original_interest)
+
+    # Step 3: Discount factors from the prepayment date (cached per curve)
+    freq_map = {'monthly': 1, 'quarterly': 3, 'semiannual': 6, 'annual': 12}
+    months_per_period = freq_map[data['frequency'].lower()]
+    num_periods = len(original_principal)
+
+    curve = curve or default_curve()
+    discount_factors = curve.discount_factors(data['prepayment_date'], months_per_period, num_periods).tolist()
+    return original_principal, original_interest, adjusted_principal, adjusted_interest, discount_factors
+
 
+def _present_value(principal, interest, discount_factors):
+    return sum((p + i) * df for p, i, df in zip(principal, interest, discount_factors))
+
+
+def _cost(pv_original, pv_adjusted):
+    # Overflowing inputs (e.g. balance=1e308) give inf/NaN, which is not a price
+    cost = round(pv_original - pv_adjusted, 2)
+    if not math.isfinite(cost):
+        raise ValueError(NON_FINITE_COST)
+    return cost
 
 
 def compute_break_funding_cost(
@@ -134,11 +180,13 @@ def compute_break_funding_cost(
     loan_rate,
     amortization_type,
     prepayment_date,
-    prepayment_amount
+    prepayment_amount,
+    curve=None,
+    prepayment_mode='backload',
+    day_count=None,
+    calendar=None,
+    custom_principal=None
 ):
-    import math
-
-    # Step 1: Compute original cashflows
     data = {
         'effective_date': effective_date,
         'maturity_date': maturity_date,
@@ -148,78 +196,111 @@ def compute_break_funding_cost(
         'amortization_type': amortization_type,
         'prepayment_date': prepayment_date,
         'prepayment_amount': prepayment_amount,
+        'prepayment_mode': prepayment_mode,
+        'day_count': day_count,
+        'calendar': calendar,
+        'custom_principal': custom_principal,
     }
-    original_principal, original_interest = compute_original_cashflow(data)
-
-    # Step 2: Compute adjusted cashflows (after prepayment)
-    adjusted_principal, adjusted_interest = compute_prepayment_cashflow(data, original_principal, original_interest)
-
-    # Step 3: Generate a fake SOFR curve for discounting
-    freq_map = {'monthly': 1, 'quarterly': 3, 'semiannual': 6, 'annual': 12}
-    months_per_period = freq_map[frequency.lower()]
-    num_periods = len(original_principal)
-
-    dt = datetime.datetime.strptime(prepayment_date, "%Y-%m-%d")
-    discount_factors = []
-    for i in range(num_periods):
-        future_date = dt + relativedelta(months=i * months_per_period)
-        t = (future_date - dt).days / 365.0
-        rate = 0.05 + 0.0005 * i  # Example fake SOFR curve
-        df = 1 / ((1 + rate) ** t)
-        discount_factors.append(df)
+    (original_principal, original_interest,
+     adjusted_principal, adjusted_interest, discount_factors) = break_funding_cashflows(data, curve)
 
     # Step 4: Compute NPV of original and adjusted cashflows
-    pv_original = sum(
-        (p + i) * df for p, i, df in zip(original_principal, original_interest, discount_factors)
-    )
-    pv_adjusted = sum(
-        (p + i) * df for p, i, df in zip(adjusted_principal, adjusted_interest, discount_factors)
-    )
+    pv_original = _present_value(original_principal, original_interest, discount_factors)
+    pv_adjusted = _present_value(adjusted_principal, adjusted_interest, discount_factors)
 
     # Step 5: Return break funding cost
-    return round(pv_original - pv_adjusted, 2)
+    return _cost(pv_original, pv_adjusted)
+
+
+def break_funding_breakdown(data, curve=None):
+    """
+    compute_break_funding_cost plus everything behind it, as plain JSON-ready
+    values: payment dates, original and adjusted schedules, discount factors
+    and both present values.
+    """
+    (original_principal, original_interest,
+     adjusted_principal, adjusted_interest, discount_factors) = break_funding_cashflows(data, curve)
+    pv_original = _present_value(original_principal, original_interest, discount_factors)
+    pv_adjusted = _present_value(adjusted_principal, adjusted_interest, discount_factors)
+
+    payment_dates = get_schedule(data).payment_dates[1:]
+    return {
+        'break_funding_cost': _cost(pv_original, pv_adjusted),
+        'pv_original': pv_original,
+        'pv_adjusted': pv_adjusted,
+        'payment_dates': np.datetime_as_string(payment_dates, unit='D').tolist(),
+        'original': {'principal': original_principal, 'interest': original_interest},
+        'adjusted': {'principal': adjusted_principal, 'interest': adjusted_interest},
+        'discount_factors': discount_factors,
+    }
 
-    
 
-def generate_cashflow_plot(data):
-    # Step 1: Compute original and adjusted schedules
-    original_principal, original_interest = compute_original_cashflow(data)
-    adjusted_principal, adjusted_interest = compute_prepayment_cashflow(data, original_principal, original_interest)
+# Stack order (bottom to top) and colors, shared by the Matplotlib and browser charts
+CHART_SERIES = (
+    ('prepaid_interest', 'Prepaid Interest', '#c6d9ec'),
+    ('prepaid_principal', 'Prepaid Principal', '#6baed6'),
+    ('remaining_interest', 'Remaining Interest', '#fdbf6f'),
+    ('remaining_principal', 'Remaining Principal', '#e6550d'),
+)
 
-    # Step 2: Compute stacked components
-    prepaid_principal = [orig - adj for orig, adj in zip(original_principal, adjusted_principal)]
-    remaining_principal = adjusted_principal
-    prepaid_interest = [0] * len(original_interest)
-    remaining_interest = adjusted_interest
 
-    # Step 3: Build date labels
-    start = datetime.datetime.strptime(data['effective_date'], "%Y-%m-%d")
-    end = datetime.datetime.strptime(data['maturity_date'], "%Y-%m-%d")
-    freq_map = {'monthly': 1, 'quarterly': 3, 'semiannual': 6, 'annual': 12}
-    months_per_period = freq_map[data['frequency'].lower()]
+def cashflow_components(data):
+    """
+    Period start dates and the four stacked components of the cashflow
+    chart, keyed as in CHART_SERIES.
+    """
+    original_principal, original_interest = compute_original_cashflow(data)
+    adjusted_principal, adjusted_interest = compute_prepayment_cashflow(data, original_principal, original_interest)
 
-    dates = []
-    dt = start
-    while dt < end:
-        dates.append(dt.strftime('%Y-%m-%d'))
-        dt += relativedelta(months=+months_per_period)
-    if len(dates) < len(original_principal):
-        dates.append(end.strftime('%Y-%m-%d'))
+    components = {
+        'prepaid_interest': [0] * len(original_interest),
+        'prepaid_principal': [orig - adj for orig, adj in zip(original_principal, adjusted_principal)],
+        'remaining_interest': adjusted_interest,
+        'remaining_principal': adjusted_principal,
+    }
+    # Date labels from the shared schedule grid (period start dates)
+    labels = np.datetime_as_string(get_schedule(data).period_starts, unit='D').tolist()
+    return labels, components
+
+
+def cashflow_chart_data(data):
+    """
+    The cashflow chart as compact JSON-ready data for drawing in the browser:
+    date labels plus one series (name, color, amounts in cents precision)
+    per stacked component, bottom first.
+    """
+    labels, components = cashflow_components(data)
+    return {
+        'labels': labels,
+        'series': [
+            {'key': key, 'name': name, 'color': color,
+             'values': [round(float(value), 2) for value in components[key]]}
+            for key, name, color in CHART_SERIES
+        ],
+    }
 
-    x = range(len(original_principal))
-    labels = dates[:len(original_principal)]
 
-    # Step 4: Plot
-    plt.style.use('ggplot')
-    fig, ax = plt.subplots(figsize=(18, 10))
+def build_cashflow_figure(data, figsize=(18, 10)):
+    """
+    Draw the stacked original/prepayment cashflow chart on a standalone
+    Agg-backed Figure (no pyplot state). Call inside CHART_STYLE's rc_context
+    to get the ggplot look.
+    """
+    # Step 1: Original and adjusted schedules as stacked components
+    labels, components = cashflow_components(data)
+    prepaid_interest = components['prepaid_interest']
+    prepaid_principal = components['prepaid_principal']
+    remaining_interest = components['remaining_interest']
+    remaining_principal = components['remaining_principal']
+    x = range(len(prepaid_principal))
+
+    # Step 2: Plot
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
 
     # Professional muted color palette
-    colors = {
-        'Prepaid Interest': '#c6d9ec',
-        'Prepaid Principal': '#6baed6',
-        'Remaining Interest': '#fdbf6f',
-        'Remaining Principal': '#e6550d',
-    }
+    colors = {name: color for _, name, color in CHART_SERIES}
 
     ax.bar(x, prepaid_interest, label='Prepaid Interest', color=colors['Prepaid Interest'])
     ax.bar(x, prepaid_principal, bottom=prepaid_interest, label='Prepaid Principal', color=colors['Prepaid Principal'])
@@ -253,6 +334,11 @@ def generate_cashflow_plot(data):
     ax.grid(False, axis='x')
 
     # Tight and clean layout
-    plt.tight_layout(pad=2.0)
-    plt.savefig("static/plot.png", dpi=300, bbox_inches='tight')
-    plt.close()
\ No newline at end of file
+    fig.tight_layout(pad=2.0)
+    return fig
+
+
+def generate_cashflow_plot(data, path="static/plot.png", dpi=300):
+    with matplotlib.style.context(CHART_STYLE):
+        fig = build_cashflow_figure(data)
+        fig.savefig(path, dpi=dpi, bbox_inches='tight')
\ No newline at end of file
@@ -0,0 +1,75 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+
+# 'periodic' is the calculator's original accrual: annual rate x months / 12
+# per period regardless of the actual dates.
+DAY_COUNTS = ('periodic', '30/360', 'ACT/360', 'ACT/365F')
+
+CALENDAR_DIR = os.getenv("CALENDAR_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'calendars'))
+
+
+def year_fractions(start, end, day_count):
+    """
+    Accrual year fractions between paired datetime64[D] arrays of start and
+    end dates. 30/360 is the US (bond basis) variant.
+    """
+    start = np.asarray(start, dtype='datetime64[D]')
+    end = np.asarray(end, dtype='datetime64[D]')
+    if day_count == 'ACT/360':
+        return (end - start).astype(int) / 360.0
+    if day_count == 'ACT/365F':
+        return (end - start).astype(int) / 365.0
+    if day_count == '30/360':
+        y1, m1, d1 = _ymd(start)
+        y2, m2, d2 = _ymd(end)
+        d1 = np.minimum(d1, 30)
+        d2 = np.where((d2 == 31) & (d1 == 30), 30, d2)
+        return ((y2 - y1) * 360 + (m2 - m1) * 30 + (d2 - d1)) / 360.0
+    raise ValueError(f"Unknown day count: {day_count}")
+
+
+def _ymd(dates):
+    months = dates.astype('datetime64[M]')
+    years = dates.astype('datetime64[Y]')
+    day = (dates - months.astype('datetime64[D]')).astype(int) + 1
+    month = (months - years.astype('datetime64[M]')).astype(int) + 1
+    return years.astype(int) + 1970, month, day
+
+
+def available_calendars():
+    """
+    Names of the holiday calendars in CALENDAR_DIR (file names without .txt).
+    """
+    if not os.path.isdir(CALENDAR_DIR):
+        return []
+    return sorted(name[:-4] for name in os.listdir(CALENDAR_DIR) if name.endswith('.txt'))
+
+
+@lru_cache(maxsize=16)
+def load_calendar(name):
+    """
+    Business-day calendar (weekends plus the listed holidays) from
+    CALENDAR_DIR/<name>.txt, one YYYY-MM-DD date per line, '#' starting a
+    comment. Parsed once per process.
+    """
+    if name not in available_calendars():
+        raise ValueError(f"Unknown holiday calendar: {name}")
+    holidays = []
+    with open(os.path.join(CALENDAR_DIR, f"{name}.txt")) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                holidays.append(line)
+    return np.busdaycalendar(weekmask='1111100', holidays=np.array(holidays, dtype='datetime64[D]'))
+
+
+def modified_following(dates, calendar):
+    """
+    Roll dates that fall on a weekend or holiday to the next business day,
+    unless that crosses into the next month, in which case roll back.
+    """
+    return np.busday_offset(np.asarray(dates, dtype='datetime64[D]'), 0,
+                            roll='modifiedfollowing', busdaycal=load_calendar(calendar))
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+from io import BytesIO
+
+import matplotlib.style
+
+from cache import LRUCache, hash_key
+from calculations import CHART_STYLE, build_cashflow_figure, cashflow_chart_data
+from loan_inputs import OPTIONAL_FIELDS
+from metrics import register_cache
+from scenarios import build_scenario_heatmap
+
+
+CHART_FIELDS = [
+    'effective_date', 'maturity_date', 'frequency', 'amortization_type',
+    'loan_rate', 'balance', 'prepayment_date', 'prepayment_amount'
+]
+
+# Pricing options that change the chart when present (normalized as in loan_inputs)
+CHART_OPTIONAL_FIELDS = ['prepayment_mode', 'day_count', 'calendar', 'custom_principal']
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+DEFAULT_FIGSIZE = (18, 10)
+WEB_DPI = 100
+EXPORT_DPI = 300
+
+# 'interactive' draws the page's chart in the browser from /chart.json;
+# 'image' shows the Matplotlib PNG. PPT export always uses Matplotlib.
+CHART_MODE = os.getenv("CHART_MODE", "interactive")
+
+# Rendered images keyed by chart_key(); bounded so memory stays flat
+render_cache = LRUCache(max_size=128)
+register_cache('chart', render_cache.info)
+
+# rc_context changes process-wide rcParams, so renders are serialized
+_render_lock = threading.Lock()
+
+
+def canonical_inputs(data):
+    """
+    The chart inputs in a canonical form, so '4.5' and 4.5 or 'Monthly' and
+    'monthly' describe the same chart. CHART_OPTIONAL_FIELDS are included
+    when given; an unreadable one raises ValueError rather than being dropped.
+    """
+    canonical = {}
+    for field in CHART_FIELDS:
+        value = data[field]
+        if field in ('loan_rate', 'balance', 'prepayment_amount'):
+            value = float(value)
+        else:
+            value = str(value).strip()
+            if field in ('frequency', 'amortization_type'):
+                value = value.lower()
+        canonical[field] = value
+
+    for field in CHART_OPTIONAL_FIELDS:
+        value = data.get(field)
+        if value is None or (isinstance(value, str) and value.strip() in ('', 'None')):
+            continue
+        normalize, message = OPTIONAL_FIELDS[field]
+        if field == 'custom_principal':
+            value = normalize(value if isinstance(value, (list, tuple, dict)) else str(value))
+        elif isinstance(value, str):
+            value = normalize(value)
+        else:
+            value = ''
+        if not value:
+            raise ValueError(message)
+        canonical[field] = value
+    return canonical
+
+
+def render_cashflow_chart(data, fmt='png', dpi=WEB_DPI, figsize=DEFAULT_FIGSIZE):
+    """
+    Render the cashflow chart to PNG or SVG bytes in memory.
+
+    Results are cached by a hash of the canonical loan inputs (including
+    any CHART_OPTIONAL_FIELDS) and render options, so repeated calculate/download cycles for the same deal render once.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported chart format: {fmt}")
+    inputs = canonical_inputs(data)
+    key = hash_key(inputs, fmt, dpi, list(figsize))
+    return render_cache.get_or_compute(key, lambda: _render(inputs, fmt, dpi, figsize))
+
+
+def cashflow_chart_json(data):
+    """
+    The cashflow chart's series (calculations.cashflow_chart_data) as compact
+    JSON bytes, for the browser to draw instead of a rendered image.
+    """
+    return json.dumps(cashflow_chart_data(canonical_inputs(data)), separators=(',', ':')).encode('utf-8')
+
+
+def _render(data, fmt, dpi, figsize):
+    buffer = BytesIO()
+    with _render_lock, matplotlib.style.context(CHART_STYLE):
+        fig = build_cashflow_figure(data, figsize=figsize)
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def render_scenario_heatmap(grid, fmt='png', dpi=WEB_DPI):
+    """
+    Render a scenarios.ScenarioGrid heatmap to PNG or SVG bytes, cached by
+    the grid's contents.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported chart format: {fmt}")
+    dates = [str(d) for d in grid.prepayment_dates]
+    key = hash_key('scenarios', dates, grid.labels, grid.costs.tolist(), fmt, dpi)
+    return render_cache.get_or_compute(key, lambda: _render_heatmap(grid, fmt, dpi))
+
+
+def _render_heatmap(grid, fmt, dpi):
+    buffer = BytesIO()
+    with _render_lock, matplotlib.style.context(CHART_STYLE):
+        fig = build_scenario_heatmap(grid)
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
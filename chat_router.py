@@ -0,0 +1,177 @@
+"""
+Local answers for the chat box, tried before the model is called:
+
+- an intent router: precompiled patterns checked in order, each with a
+  canned answer (FAQ-style treasury questions are answered without a call);
+- an answer cache: previous model answers keyed by the normalized question,
+  matched exactly or, failing that, by token overlap.
+"""
+import os
+import re
+
+from cache import LRUCache
+from metrics import register_cache
+
+
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", 1024))
+CHAT_CACHE_TTL = int(os.getenv("CHAT_CACHE_TTL", 24 * 3600))  # seconds a model answer is reused
+CHAT_FUZZY_THRESHOLD = float(os.getenv("CHAT_FUZZY_THRESHOLD", 0.85))  # token Jaccard similarity
+
+OFF_TOPIC_ANSWER = (
+    "I'm an expert in bank treasury finance and I'm here to answer your questions related to break-funding "
+    "and fund transfer pricing. I'm sorry, but I cannot answer your question as it is not related to my area "
+    "of expertise."
+)
+IMPACT_ANSWER = (
+    "The calculation separates the loan’s interest into two parts: "
+    "interest accrued before the prepayment date and interest accruing after. "
+    "It then measures how the prepayment reduces the principal balance, creating prepaid principal cash flows. "
+    "By comparing the original and adjusted schedules, it quantifies the impact of prepayment on both principal "
+    "and interest payments. "
+)
+BREAK_FUNDING_ANSWER = (
+    "Break-funding refers to the cost a bank incurs when a fixed-rate loan is prepaid before maturity. "
+    "It reflects the loss from having to reinvest the prepaid amount at lower current market rates compared "
+    "to the original funding terms."
+)
+FTP_ANSWER = (
+    "FTP stands for Fund Transfer Pricing. It is an internal system used by banks to allocate the cost of funds "
+    "to different business units, ensuring pricing transparency and incentivizing responsible risk and "
+    "liquidity management."
+)
+DISCOUNTING_ANSWER = (
+    "Both the original and the adjusted cash flows are discounted from the prepayment date with discount "
+    "factors from the SOFR curve. The break-funding cost is the present value of the original cash flows "
+    "minus the present value of the adjusted ones."
+)
+AMORTIZATION_ANSWER = (
+    "Interest only loans repay all principal at maturity. Equal (level payment) loans pay the same "
+    "installment every period. Linear loans repay the same principal every period, so installments fall "
+    "over time. Custom loans follow an uploaded repayment schedule."
+)
+
+
+def _impact_answer(break_funding_cost):
+    if break_funding_cost is None:
+        return IMPACT_ANSWER
+    return (IMPACT_ANSWER + "The resulting cash flow visualization clearly shows these components, and the "
+            "total impact of the prepayment on the loan’s cost is " + f"${break_funding_cost:,.2f}" + ".")
+
+
+# (intent, pattern, answer) checked in order; the first match answers.
+# An answer is a string or a function of the current break-funding cost.
+INTENTS = [
+    ('off_topic', r"\b(?:cars?|colou?rs?|weather)\b", OFF_TOPIC_ANSWER),
+    ('impact', r"\b(?:impact|cost|effect|calculat|savings|reduction)", _impact_answer),
+    ('break_funding', r"\b(?:break[\s-]?fund|break cost|prepay penalty)", BREAK_FUNDING_ANSWER),
+    ('ftp', r"\b(?:ftp|fund transfer pricing|transfer pric)", FTP_ANSWER),
+    ('discounting', r"\b(?:discount|present value|npv|sofr|yield curve)", DISCOUNTING_ANSWER),
+    ('amortization', r"\b(?:amorti[sz]|interest[\s-]only|level payment)", AMORTIZATION_ANSWER),
+]
+_COMPILED_INTENTS = [(name, re.compile(pattern, re.IGNORECASE), answer) for name, pattern, answer in INTENTS]
+
+
+def route(question, break_funding_cost=None):
+    """
+    (intent, answer) for the first intent whose pattern matches `question`,
+    or (None, None) when the question needs the model.
+    """
+    for name, pattern, answer in _COMPILED_INTENTS:
+        if pattern.search(question):
+            return name, answer(break_funding_cost) if callable(answer) else answer
+    return None, None
+
+
+_FILLER_WORDS = frozenset(('a', 'an', 'the', 'please', 'pls', 'me', 'can', 'could', 'would', 'you', 'kindly'))
+
+
+def normalize_question(question):
+    """
+    Lowercase words without punctuation or filler words, with plurals and
+    "n't" folded, so "What's FTP?" and "what is the FTP" normalize alike.
+    """
+    text = question.lower().replace("’", "'").replace("n't", " not").replace("'s", " is").replace("-", " ")
+    words = []
+    for word in re.findall(r"[a-z0-9.%$]+", text):
+        word = word.strip('.')
+        if not word or word in _FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return ' '.join(words)
+
+
+_NEGATIONS = frozenset(('not', 'no', 'never', 'without', 'nor', 'cannot'))
+
+
+def _numbers(tokens):
+    return {token for token in tokens if any(char.isdigit() for char in token)}
+
+
+def _negations(tokens):
+    return tokens & _NEGATIONS
+
+
+class AnswerCache:
+    """
+    Model answers keyed by normalized question, bounded by size and TTL.
+
+    A lookup tries the exact normalized question, then the cached question
+    with the highest token Jaccard similarity of at least `threshold` and the
+    same numbers and negations (so "rate of 5%" never reuses the answer for
+    "rate of 6%", nor "should the bank charge" the one for "should the bank not
+    charge").
+    """
+
+    def __init__(self, max_size=CHAT_CACHE_SIZE, ttl=CHAT_CACHE_TTL, threshold=CHAT_FUZZY_THRESHOLD):
+        self.answers = LRUCache(max_size=max_size, ttl=ttl)
+        self.threshold = threshold
+        self.fuzzy_hits = 0
+
+    def get(self, question):
+        key = normalize_question(question)
+        if not key:
+            return None
+        entry = self.answers.get(key)
+        if entry is not None:
+            return entry[1]
+
+        tokens = frozenset(key.split())
+        numbers, negations = _numbers(tokens), _negations(tokens)
+        # Jaccard >= threshold needs the smaller set within threshold of the larger
+        shortest, longest = len(tokens) * self.threshold, len(tokens) / self.threshold
+        best, best_score = None, self.threshold
+        for _, (other, answer) in self.answers.items():
+            if not shortest <= len(other) <= longest:
+                continue
+            score = len(tokens & other) / len(tokens | other)
+            if score >= best_score and _numbers(other) == numbers and _negations(other) == negations:
+                best, best_score = answer, score
+        if best is not None:
+            self.fuzzy_hits += 1
+            self.answers.put(key, (tokens, best))
+        return best
+
+    def put(self, question, answer):
+        key = normalize_question(question)
+        if key and answer:
+            self.answers.put(key, (frozenset(key.split()), answer))
+
+    def clear(self):
+        self.answers.clear()
+        self.fuzzy_hits = 0
+
+    def info(self):
+        # Fuzzy hits are exact-key misses that still avoided a model call
+        stats = self.answers.info()
+        stats['hits'] += self.fuzzy_hits
+        stats['misses'] -= self.fuzzy_hits
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['fuzzy_hits'] = self.fuzzy_hits
+        return stats
+
+
+answer_cache = AnswerCache()
+register_cache('chat_answers', answer_cache.info)
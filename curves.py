@@ -0,0 +1,244 @@
+import csv
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from cache import LRUCache
+from metrics import register_cache
+from calendars import year_fractions
+from schedule import add_months, parse_date
+
+
+INTERPOLATIONS = ('log_linear', 'monotone_cubic')
+DISCOUNT_DAY_COUNTS = ('ACT/365F', 'ACT/360', '30/360')
+
+# Snapshot loaded by default_curve() when set, e.g. data/sofr_curve.json
+CURVE_PATH_ENV = "DISCOUNT_CURVE_PATH"
+
+
+class BaseCurve:
+    """
+    Common interface for discounting curves.
+
+    Subclasses implement _compute_factors(); discount_factors() adds a bounded
+    LRU cache keyed by (valuation date, months per period, period count) so a
+    book priced against one curve builds each factor vector once.
+    """
+
+    def __init__(self, cache_size=4096, day_count='ACT/365F'):
+        if day_count not in DISCOUNT_DAY_COUNTS:
+            raise ValueError(f"Unknown day count: {day_count}")
+        self.day_count = day_count
+        self._cache = LRUCache(max_size=cache_size)
+
+    def discount_factors(self, valuation_date, months_per_period, num_periods):
+        """
+        Discount factors from `valuation_date` for each of `num_periods`
+        dates spaced `months_per_period` apart, starting at the valuation date
+        itself. The returned array is shared between callers and read-only.
+        """
+        key = (parse_date(valuation_date), int(months_per_period), int(num_periods))
+        return self._cache.get_or_compute(key, lambda: self._readonly_factors(*key))
+
+    def cache_info(self):
+        return self._cache.info()
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _readonly_factors(self, valuation_date, months_per_period, num_periods):
+        factors = self._compute_factors(valuation_date, months_per_period, num_periods)
+        factors.setflags(write=False)
+        return factors
+
+    def _compute_factors(self, valuation_date, months_per_period, num_periods):
+        raise NotImplementedError
+
+
+def payment_year_fractions(valuation_date, months_per_period, num_periods, day_count='ACT/365F'):
+    """
+    Year fractions (ACT/365F unless told otherwise) from the valuation date
+    to the valuation date plus k * months_per_period months,
+    k = 0 .. num_periods - 1.
+    """
+    periods = np.arange(num_periods)
+    dates = add_months(valuation_date, periods * months_per_period)
+    return year_fractions(valuation_date, dates, day_count)
+
+
+class ExampleSofrCurve(BaseCurve):
+    """
+    The illustrative curve the calculator has always used: period k is
+    discounted at an annually compounded 5% + 0.05% * k.
+    """
+
+    def _compute_factors(self, valuation_date, months_per_period, num_periods):
+        t = payment_year_fractions(valuation_date, months_per_period, num_periods, self.day_count)
+        rate = 0.05 + 0.0005 * np.arange(num_periods)
+        return 1 / ((1 + rate) ** t)
+
+
+def _pchip_slopes(x, y):
+    """
+    Fritsch-Carlson derivatives for a monotone piecewise cubic Hermite
+    interpolant through (x, y).
+    """
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    slopes = np.zeros_like(y)
+    if len(x) == 2:
+        slopes[:] = delta[0]
+        return slopes
+
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same_sign = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        harmonic = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+    slopes[1:-1] = np.where(same_sign, harmonic, 0.0)
+
+    for end, (h0, h1, d0, d1) in ((0, (h[0], h[1], delta[0], delta[1])),
+                                   (-1, (h[-1], h[-2], delta[-1], delta[-2]))):
+        d = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+        if np.sign(d) != np.sign(d0):
+            d = 0.0
+        elif np.sign(d0) != np.sign(d1) and abs(d) > abs(3 * d0):
+            d = 3 * d0
+        slopes[end] = d
+    return slopes
+
+
+class DiscountCurve(BaseCurve):
+    """
+    Zero curve built once from pillar tenors (years) and annually compounded
+    zero rates (decimals).
+
+    'log_linear' interpolates log discount factors linearly in time (flat
+    forwards between pillars, last forward extrapolated). 'monotone_cubic'
+    interpolates zero rates with a Fritsch-Carlson monotone cubic and holds
+    them flat outside the pillar range.
+
+    With an `as_of` date, factors for a later valuation date are forward
+    discount factors P(as_of, t) / P(as_of, valuation). Without one the curve
+    is taken as spot on whatever valuation date is requested.
+    """
+
+    def __init__(self, tenors, rates, interpolation='log_linear', as_of=None, cache_size=4096,
+                 day_count='ACT/365F'):
+        super().__init__(cache_size, day_count)
+        tenors = np.asarray(tenors, dtype=float)
+        rates = np.asarray(rates, dtype=float)
+        if tenors.ndim != 1 or tenors.shape != rates.shape or len(tenors) == 0:
+            raise ValueError("Curve needs matching, non-empty tenor and rate lists")
+        if np.any(tenors <= 0) or np.any(np.diff(tenors) <= 0):
+            raise ValueError("Curve tenors must be positive and strictly increasing")
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f"Unknown interpolation: {interpolation}")
+
+        self.tenors = tenors
+        self.rates = rates
+        self.interpolation = interpolation
+        self.as_of = parse_date(as_of) if as_of is not None else None
+
+        # Log-linear nodes include t = 0 where log(df) = 0
+        self._nodes = np.concatenate(([0.0], tenors))
+        self._log_dfs = np.concatenate(([0.0], -tenors * np.log1p(rates)))
+        if len(tenors) > 1:
+            self._slopes = _pchip_slopes(tenors, rates)
+
+    def zero_rates(self, times):
+        times = np.asarray(times, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.expm1(-self._log_df(times) / times)
+        return np.where(times > 0, rates, self.rates[0])
+
+    def df(self, times):
+        """
+        Discount factors for an array of year fractions.
+        """
+        return np.exp(self._log_df(np.asarray(times, dtype=float)))
+
+    def _log_df(self, times):
+        if self.interpolation == 'log_linear':
+            log_dfs = np.interp(times, self._nodes, self._log_dfs)
+            beyond = times > self._nodes[-1]
+            if beyond.any():
+                last_slope = (self._log_dfs[-1] - self._log_dfs[-2]) / (self._nodes[-1] - self._nodes[-2])
+                log_dfs = np.where(beyond, self._log_dfs[-1] + last_slope * (times - self._nodes[-1]), log_dfs)
+            return log_dfs
+        return -times * np.log1p(self._cubic_rates(times))
+
+    def _cubic_rates(self, times):
+        x, y = self.tenors, self.rates
+        if len(x) == 1:
+            return np.full_like(times, y[0])
+        t = np.clip(times, x[0], x[-1])
+        k = np.clip(np.searchsorted(x, t, side='right') - 1, 0, len(x) - 2)
+        h = x[k + 1] - x[k]
+        s = (t - x[k]) / h
+        h00 = (1 + 2 * s) * (1 - s) ** 2
+        h10 = s * (1 - s) ** 2
+        h01 = s ** 2 * (3 - 2 * s)
+        h11 = s ** 2 * (s - 1)
+        return h00 * y[k] + h10 * h * self._slopes[k] + h01 * y[k + 1] + h11 * h * self._slopes[k + 1]
+
+    def _compute_factors(self, valuation_date, months_per_period, num_periods):
+        t = payment_year_fractions(valuation_date, months_per_period, num_periods, self.day_count)
+        if self.as_of is None:
+            return self.df(t)
+        offset = max(float(year_fractions(self.as_of, valuation_date, self.day_count)), 0.0)
+        return self.df(offset + t) / self.df(offset)
+
+
+def load_curve(path, interpolation=None, cache_size=4096):
+    """
+    Load a DiscountCurve from a local snapshot.
+
+    CSV files need 'tenor' (years) and 'rate' (decimal) columns. JSON files
+    hold {"as_of": "YYYY-MM-DD", "interpolation": ..., "pillars":
+    [{"tenor": ..., "rate": ...}, ...]}; as_of, interpolation and day_count
+    (for discounting times, default ACT/365F) are optional.
+    An explicit `interpolation` argument overrides the file.
+    """
+    as_of = None
+    file_interpolation = None
+    day_count = 'ACT/365F'
+    if str(path).lower().endswith('.json'):
+        with open(path) as f:
+            snapshot = json.load(f)
+        pillars = snapshot['pillars']
+        as_of = snapshot.get('as_of')
+        file_interpolation = snapshot.get('interpolation')
+        day_count = snapshot.get('day_count', day_count)
+    else:
+        with open(path, newline='') as f:
+            pillars = list(csv.DictReader(f))
+
+    tenors = [float(p['tenor']) for p in pillars]
+    rates = [float(p['rate']) for p in pillars]
+    return DiscountCurve(
+        tenors, rates,
+        interpolation=interpolation or file_interpolation or 'log_linear',
+        as_of=as_of,
+        cache_size=cache_size,
+        day_count=day_count,
+    )
+
+
+@lru_cache(maxsize=1)
+def default_curve():
+    """
+    Curve used when callers do not pass one: the snapshot named by
+    DISCOUNT_CURVE_PATH if set, otherwise the example SOFR curve. Built once
+    per process.
+    """
+    path = os.getenv(CURVE_PATH_ENV)
+    if path:
+        return load_curve(path)
+    return ExampleSofrCurve()
+
+
+# Discount factors of the shared default curve
+register_cache('discount_factors', lambda: default_curve().cache_info())
@@ -1,16 +1,44 @@
-import fitz  # PyMuPDF
 import json
+import logging
 import os
+import re
+from dateutil import parser as date_parser
 from huggingface_hub import InferenceClient
 
+from chat_router import answer_cache, route
+from extraction_cache import ExtractionCache
+from llm_client import LLM_TIMEOUT, LLMGateway
+from metrics import CHAT_ANSWERS, REGISTRY, record_error, stage
+from pdf_stream import iter_page_texts, spool_upload
+
+logger = logging.getLogger(__name__)
+
 # Hugging Face API token from environment variable
 HUGGINGFACE_API_TOKEN = os.getenv("HF_TOKEN")
 
 # Use a chat model instead of a pure text-generation one
 HF_MODEL = "mistralai/Mistral-7B-Instruct-v0.2"  # or any chat-compatible model
 
-# Initialize the client
-client = InferenceClient(model=HF_MODEL, token=HUGGINGFACE_API_TOKEN)
+# Optional OpenAI-compatible endpoint, e.g. llm_stub_server.py for local testing
+HF_ENDPOINT_URL = os.getenv("HF_ENDPOINT_URL")
+
+# Initialize the client; every call goes through the bounded gateway
+if HF_ENDPOINT_URL:
+    client = InferenceClient(base_url=HF_ENDPOINT_URL, token=HUGGINGFACE_API_TOKEN, timeout=LLM_TIMEOUT)
+else:
+    client = InferenceClient(model=HF_MODEL, token=HUGGINGFACE_API_TOKEN, timeout=LLM_TIMEOUT)
+llm = LLMGateway(client)
+
+
+def _llm_gateway_metrics():
+    return [
+        ('breakfunding_llm_calls_total', 'counter', "Model calls started by the gateway.", [({}, llm.calls)]),
+        ('breakfunding_llm_coalesced_total', 'counter', "Requests that joined an identical in-flight call.",
+         [({}, llm.coalesced)]),
+    ]
+
+
+REGISTRY.register_collector(_llm_gateway_metrics)
 
 FIELDS = [
     "Effective Date", "Maturity Date", "Frequency", "Amortization Type",
@@ -21,18 +49,121 @@ FIELDS = [
 def extract_text_from_pdf(pdf_file) -> str:
     """
     Extract all text from the PDF file stream using PyMuPDF.
+    The stream is spooled to a temporary file and read page by page.
+    """
+    with spool_upload(pdf_file) as (path, _):
+        return "\n".join(iter_page_texts(path))
+
+
+# Patterns that mark a block of text as relevant to each field
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*"
+_DATE = rf"(?:\b\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTHS}\.?,?\s+\d{{4}}|\b{_MONTHS}\.?\s+\d{{1,2}},?\s+\d{{4}}|\b\d{{1,2}}/\d{{1,2}}/\d{{2,4}}\b|\b\d{{4}}-\d{{2}}-\d{{2}}\b)"
+FIELD_PATTERNS = {
+    "Effective Date": [r"effective date", r"issue date", r"settlement date", r"drawdown date", r"trade date", r"commencement", _DATE],
+    "Maturity Date": [r"maturity", r"final (?:repayment|payment) date", r"termination date", r"expir", _DATE],
+    "Frequency": [r"\b(?:monthly|quarterly|semi-?annual(?:ly)?|annual(?:ly)?|per annum)\b", r"payment dates?", r"interest periods?", r"each " + _MONTHS],
+    "Amortization Type": [r"amorti[sz]", r"repayment", r"instal?ments?", r"bullet", r"interest[- ]only", r"annuity"],
+    "Loan Rate": [r"\d+(?:\.\d+)?\s*(?:%|per cent|percent)", r"fixed rate", r"interest rate", r"coupon", r"margin"],
+    "Balance": [r"notional", r"principal amount", r"facility amount", r"commitment", r"proceeds", r"(?:usd|eur|gbp|\$|€|£)\s?\d[\d,]*"],
+}
+_COMPILED_PATTERNS = {
+    field: [re.compile(p, re.IGNORECASE) for p in patterns]
+    for field, patterns in FIELD_PATTERNS.items()
+}
+
+# Approximate prompt budget for document text (about 4 characters per token)
+PROMPT_TOKEN_BUDGET = 2000
+CHARS_PER_TOKEN = 4
+BLOCK_MAX_LINES = 6
+
+
+def split_blocks(text: str) -> list[str]:
+    """
+    Split PyMuPDF text into small blocks: paragraphs separated by blank lines,
+    further cut into runs of at most BLOCK_MAX_LINES lines.
+    """
+    blocks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        lines = [line.strip() for line in paragraph.splitlines() if line.strip()]
+        for i in range(0, len(lines), BLOCK_MAX_LINES):
+            blocks.append("\n".join(lines[i:i + BLOCK_MAX_LINES]))
+    return blocks
+
+
+def score_block(block: str, fields: list[str] = FIELDS) -> dict:
     """
-    doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-    full_text = "\n".join(page.get_text() for page in doc)
-    return full_text
+    Per-field relevance of a block: number of matching patterns.
+    """
+    return {
+        field: sum(1 for pattern in _COMPILED_PATTERNS[field] if pattern.search(block))
+        for field in fields
+    }
 
 
-def ask_all_fields(pdf_text: str) -> list[dict]:
+def select_relevant_text(text: str, token_budget: int = PROMPT_TOKEN_BUDGET, fields: list[str] = FIELDS) -> str:
+    """
+    Keep only the blocks most likely to contain the FIELDS, within a token
+    budget. The best block for each field is taken first so every field has
+    evidence, then the remaining budget goes to the highest-scoring blocks.
+    Selected blocks keep their document order. Short documents pass through.
     """
-    Send one prompt to the model to extract all field values and their quotes.
+    char_budget = token_budget * CHARS_PER_TOKEN
+    if len(text) <= char_budget:
+        return text
+
+    blocks = split_blocks(text)
+    scores = [score_block(block, fields) for block in blocks]
+    totals = [sum(score.values()) for score in scores]
+
+    chosen = []
+    used = 0
+
+    def take(i):
+        nonlocal used
+        if i in chosen or totals[i] == 0 or used + len(blocks[i]) > char_budget:
+            return
+        chosen.append(i)
+        used += len(blocks[i]) + 1
+
+    for field in fields:
+        best = max(range(len(blocks)), key=lambda i: (scores[i][field], totals[i]), default=None)
+        if best is not None and scores[best][field] > 0:
+            take(best)
+    for i in sorted(range(len(blocks)), key=lambda i: totals[i], reverse=True):
+        take(i)
+
+    selected = "\n...\n".join(blocks[i] for i in sorted(chosen))
+    logger.info(
+        "Prompt pre-filter kept %d of %d blocks: %d -> %d chars (%.0f%% smaller)",
+        len(chosen), len(blocks), len(text), len(selected),
+        100 * (1 - len(selected) / len(text)) if text else 0,
+    )
+    return selected
+
+
+# Value format requested from the model for each field
+FIELD_VALUE_FORMATS = {
+    "Effective Date": '"MM/DD/YYYY",',
+    "Maturity Date": '"MM/DD/YYYY",',
+    "Frequency": '"...", One of monthly, quarterly, semiannual, annual',
+    "Amortization Type": '"...", One of interest only, equal, linear, custom',
+    "Loan Rate": '"...", A number in percent. Do not include percent sign',
+    "Balance": '"...", A number, ignore currency',
+}
+
+
+def ask_all_fields(pdf_text: str, fields: list[str] = FIELDS) -> list[dict]:
+    """
+    Send one prompt to the model to extract the field values and their quotes
+    (all FIELDS unless a subset is given).
     Returns a list of dicts: [{ key, value, quote }, ...]
     """
-    field_list_str = ", ".join(FIELDS)
+    field_list_str = ", ".join(fields)
+    pdf_text = select_relevant_text(pdf_text, fields=fields)
+    field_entries = ",\n".join(
+        f'{{\n  "key": "{field}",\n  "value": {FIELD_VALUE_FORMATS[field]}\n  "quote": "..."\n}}'
+        for field in fields
+    )
 
     messages = [
         {
@@ -50,36 +181,7 @@ def ask_all_fields(pdf_text: str) -> list[dict]:
 
 Respond in this JSON format, with double quotes:
 [
-{{
-  "key": "Effective Date",
-  "value": "MM/DD/YYYY",
-  "quote": "..."
-}},
-{{
-  "key": "Maturity Date",
-  "value": "MM/DD/YYYY",
-  "quote": "..."
-}},
-{{
-  "key": "Frequency",
-  "value": "...", One of monthly, quarterly, semiannual, annual
-  "quote": "..."
-}},
-{{
-  "key": "Amortization Type",
-  "value": "...", One of interest only, equal, linear, custom
-  "quote": "..."
-}},
-{{
-  "key": "Loan Rate",
-  "value": "...", A number in percent. Do not include percent sign
-  "quote": "..."
-}},
-{{
-  "key": "Balance",
-  "value": "...", A number, ignore currency
-  "quote": "..."
-}}
+{field_entries}
 ]
 
 Text:
@@ -89,12 +191,7 @@ Text:
     ]
 
     try:
-        response = client.chat_completion(
-            messages=messages,
-            temperature=0,
-        )
-
-        content = response.choices[0].message.content
+        content = llm.chat(messages, temperature=0)
         json_start = content.find('[')
         json_end = content.rfind(']') + 1
 
@@ -105,105 +202,316 @@ Text:
         parsed = json.loads(json_str)
         return parsed
     
-    except Exception as e:
-        print("Extraction error:", e)
+    except Exception:
+        record_error('llm_extract')
         return []
 
 
-def extract_loan_terms(pdf_file) -> tuple[dict, dict]:
+# Rule-based fast path. Each rule is (pattern, confidence, value builder);
+# the first group of a date/number rule holds the value.
+RULE_MIN_CONFIDENCE = 0.8
+
+_NUMBER = r"(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+_SCALE = r"(?:\s*(million|mn|mm|m|billion|bn|thousand|k)\b)?"
+_SCALES = {'thousand': 1e3, 'k': 1e3, 'million': 1e6, 'mn': 1e6, 'mm': 1e6, 'm': 1e6, 'billion': 1e9, 'bn': 1e9}
+_CURRENCY = r"(?:usd|eur|gbp|chf|jpy|us\$|\$|€|£)"
+_LABEL_END = r"\s*(?:\([^)]*\))?\s*[:\-–]?\s*"
+_FREQUENCY_WORDS = {
+    'monthly': 'monthly',
+    'quarterly': 'quarterly',
+    'semi-annually': 'semiannual',
+    'semi-annual': 'semiannual',
+    'semiannually': 'semiannual',
+    'semiannual': 'semiannual',
+    'annually': 'annual',
+    'annual': 'annual',
+}
+_MONTH_COUNT_FREQUENCY = {12: 'monthly', 4: 'quarterly', 2: 'semiannual', 1: 'annual'}
+
+
+def _date_value(match):
+    raw = match.group(1)
+    if re.fullmatch(r"\d{1,2}/\d{1,2}/\d{2,4}", raw):
+        return raw
+    try:
+        return date_parser.parse(raw).strftime("%m/%d/%Y")
+    except (ValueError, OverflowError):
+        return None
+
+
+def _rate_value(match):
+    return match.group(1)
+
+
+def _amount_value(match):
+    amount = float(match.group(1).replace(",", ""))
+    scale = (match.group(2) or "").lower()
+    amount *= _SCALES.get(scale, 1)
+    return f"{amount:.2f}".rstrip("0").rstrip(".")
+
+
+def _frequency_value(match):
+    return _FREQUENCY_WORDS.get(match.group(1).lower())
+
+
+def _listed_months_value(match):
+    months = re.findall(_MONTHS, match.group(0), re.IGNORECASE)
+    return _MONTH_COUNT_FREQUENCY.get(len(set(m[:3].lower() for m in months)))
+
+
+def _constant(value):
+    return lambda match: value
+
+
+FIELD_RULES = {
+    "Effective Date": [
+        (rf"(?:effective|issue|settlement|drawdown|utili[sz]ation|commencement|start|closing) date{_LABEL_END}({_DATE})", 0.95, _date_value),
+        (rf"(?:dated|commencing|from and including)\s+({_DATE})", 0.6, _date_value),
+    ],
+    "Maturity Date": [
+        (rf"(?:final )?(?:maturity|termination|final repayment|expiry) date{_LABEL_END}({_DATE})", 0.95, _date_value),
+        (rf"(?:matures|maturing|repayable in full) on\s+({_DATE})", 0.85, _date_value),
+    ],
+    "Frequency": [
+        (r"(?:payable|paid|pay|payments?|instal?ments?|interest periods?)[^.\n]{0,40}?\b(monthly|quarterly|semi-?annually|semi-?annual|annually)\b", 0.9, _frequency_value),
+        (rf"each\s+{_MONTHS}(?:\s*,\s*(?:and\s+)?{_MONTHS}|\s+and\s+{_MONTHS})*", 0.85, _listed_months_value),
+        (r"\b(monthly|quarterly|semi-?annually|annually)\b", 0.5, _frequency_value),
+    ],
+    "Amortization Type": [
+        # An interest-only period followed by instalments is neither plain
+        # interest only nor plain amortizing: leave it to the model
+        (r"interest[- ]only(?=[^.\n]*\binstal?ments\b)", 0.5, _constant("interest only")),
+        (r"\bbullet\b|interest[- ]only|repaid in (?:full|one amount|a single instal?ment) (?:on|at) (?:the )?(?:final )?maturity", 0.9, _constant("interest only")),
+        (r"\bannuity\b|level (?:debt service|payments?)|equal (?:\w+ )?(?:payments|instal?ments) of principal and interest", 0.9, _constant("equal")),
+        (r"equal (?:consecutive )?(?:\w+ )?instal?ments of principal(?!\s+and interest)|straight[- ]line amorti[sz]ation|constant principal", 0.9, _constant("linear")),
+        (r"amorti[sz]ation schedule|repayment schedule", 0.6, _constant("custom")),
+    ],
+    "Loan Rate": [
+        (rf"(?:fixed rate|interest rate|coupon(?: rate)?|rate of interest|loan rate)(?: of)?{_LABEL_END}{_NUMBER}\s*(?:%|per cent|percent)", 0.95, _rate_value),
+        (rf"{_NUMBER}\s*(?:%|per cent|percent) per annum", 0.7, _rate_value),
+    ],
+    "Balance": [
+        (rf"(?:notional(?: amount)?|principal amount|facility amount|loan amount|commitment|net proceeds|aggregate (?:nominal|principal) amount){_LABEL_END}{_CURRENCY}?\s*{_NUMBER}{_SCALE}", 0.95, _amount_value),
+        (rf"{_CURRENCY}\s*{_NUMBER}{_SCALE}", 0.5, _amount_value),
+    ],
+}
+_COMPILED_RULES = {
+    field: [(re.compile(pattern, re.IGNORECASE), confidence, build) for pattern, confidence, build in rules]
+    for field, rules in FIELD_RULES.items()
+}
+
+
+def _quote_for(text, match):
+    """
+    The full line(s) around a match, as the supporting quote.
+    """
+    start = text.rfind("\n", 0, match.start()) + 1
+    end = text.find("\n", match.end())
+    return " ".join(text[start:end if end != -1 else len(text)].split())
+
+
+def extract_fields_with_rules(text: str) -> dict:
+    """
+    Try every FIELDS entry with the compiled FIELD_RULES.
+    Returns {field: (value, quote, confidence)} for the fields that matched;
+    for each field the first rule in FIELD_RULES order that matches wins,
+    earliest match first.
+    """
+    found = {}
+    for field, rules in _COMPILED_RULES.items():
+        for pattern, confidence, build in rules:
+            for match in pattern.finditer(text):
+                value = build(match)
+                if value:
+                    found[field] = (value, _quote_for(text, match), confidence)
+                    break
+            if field in found:
+                break
+    return found
+
+
+def all_fields_resolved(rule_results: dict) -> bool:
+    return all(
+        field in rule_results and rule_results[field][2] >= RULE_MIN_CONFIDENCE
+        for field in FIELDS
+    )
+
+
+def _no_progress(fraction, message=''):
+    pass
+
+
+def scan_pdf_with_rules(path, progress=None) -> tuple[dict, list[str], bool]:
+    """
+    Read a spooled PDF page by page, applying the rules to each page and
+    stopping as soon as every field is resolved with confidence.
+    Returns (rule_results, page_texts read, whether every page was read).
+    """
+    progress = progress or _no_progress
+    found = {}
+    pages = []
+    page_iter = iter_page_texts(path)
+    try:
+        for page_text in page_iter:
+            pages.append(page_text)
+            for field, result in extract_fields_with_rules(page_text).items():
+                # Earlier pages win unless a later page matches a stronger rule
+                if field not in found or result[2] > found[field][2]:
+                    found[field] = result
+            if all_fields_resolved(found):
+                return found, pages, False
+            if len(pages) % 10 == 0:
+                progress(0.15, f"Read {len(pages)} pages")
+    finally:
+        page_iter.close()
+    return found, pages, True
+
+
+# Bump when the extraction prompt or its parsing changes, so cached fields
+# produced by the old prompt are not reused
+PROMPT_VERSION = "3"
+MODEL_KEY = f"{HF_MODEL}@{PROMPT_VERSION}"
+
+# Known demo documents, matched by file name, that skip the model call
+PRESET_RESULTS = {
+    "sample_term_sheet": (
+        {'effective_date': '07/09/2009', 'maturity_date': '07/09/2013', 'frequency': 'quarterly', 'amortization_type': 'equal', 'loan_rate': '3.40', 'balance': '4500000'},
+        {'effective_date': 'Issue Date: 9 July 2009 (Settlement Date)',
+         'maturity_date': 'Maturity Date: 9 July 2013',
+         'frequency': 'Interest Payment Dates: The 9th of each January, April, July, and October commencing 9 October 2009',
+         'amortization_type': 'Coupon: Subject to the Switch Feature from (and including) 9 July 2009 to (but excluding) 9 July 2013 interest shall be payable at a fixed rate of 3.40% per annum.',
+         'loan_rate': 'Coupon: Subject to the Switch Feature from (and including) 9 July 2009 to (but excluding) 9 July 2013 interest shall be payable at a fixed rate of 3.40% per annum.',
+         'balance': 'Net Proceeds: USD 4,500,000'},
+    ),
+}
+
+_extraction_cache = None
+
+
+def get_extraction_cache():
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = ExtractionCache()
+    return _extraction_cache
+
+
+def extract_loan_terms(pdf_file, progress=None) -> tuple[dict, dict]:
     """
-    Extract all loan term fields from the PDF using a single model call.
+    Extract all loan term fields from the PDF. The upload is spooled to disk
+    and read page by page; reading stops early once the rule-based extractor
+    has resolved every field with confidence. Only unresolved fields go to
+    one model call.
+    Results are cached on disk by the SHA-256 of the PDF bytes and MODEL_KEY,
+    so re-uploading the same term sheet skips parsing and the model call.
+    `progress(fraction, message)`, if given, is called as each stage starts.
     Returns:
         extracted: Dict[field_key] = value
         quotes: Dict[field_key] = quote
     """
-    if "sample_term_sheet" in pdf_file.filename:
-        extracted = {'effective_date': '07/09/2009', 'maturity_date': '07/09/2013', 'frequency': 'quarterly', 'amortization_type': 'equal', 'loan_rate': '3.40', 'balance': '4500000'}
-        quotes = {'effective_date': 'Issue Date: 9 July 2009 (Settlement Date)', 
-        'maturity_date': 'Maturity Date: 9 July 2013', 
-        'frequency': 'Interest Payment Dates: The 9th of each January, April, July, and October commencing 9 October 2009', 
-        'amortization_type': 'Coupon: Subject to the Switch Feature from (and including) 9 July 2009 to (but excluding) 9 July 2013 interest shall be payable at a fixed rate of 3.40% per annum.', 
-        'loan_rate': 'Coupon: Subject to the Switch Feature from (and including) 9 July 2009 to (but excluding) 9 July 2013 interest shall be payable at a fixed rate of 3.40% per annum.', 
-        'balance': 'Net Proceeds: USD 4,500,000'}
-        return extracted, quotes
-    else:
-        try:
-            text = extract_text_from_pdf(pdf_file)
-            field_results = ask_all_fields(text)
+    progress = progress or _no_progress
+    try:
+        progress(0.05, "Checking cache")
+        with spool_upload(pdf_file) as (path, sha256):
+            cache = get_extraction_cache()
+
+            cached = cache.get_fields(sha256, MODEL_KEY)
+            if cached is not None:
+                return cached
+
+            for marker, (extracted, quotes) in PRESET_RESULTS.items():
+                if marker in (pdf_file.filename or ""):
+                    cache.put_fields(sha256, MODEL_KEY, extracted, quotes)
+                    return dict(extracted), dict(quotes)
 
-            extracted = {}
-            quotes = {}
+            # Rules first; the model is only asked about fields they could not settle
+            text = cache.get_text(sha256)
+            if text is not None:
+                progress(0.4, "Matching standard terms")
+                rule_results = extract_fields_with_rules(text)
+            else:
+                progress(0.15, "Reading PDF")
+                with stage('pdf_parse'):
+                    rule_results, pages, complete = scan_pdf_with_rules(path, progress)
+                if complete:
+                    text = "\n".join(pages)
+                    cache.put_text(sha256, text)
 
+        extracted = {}
+        quotes = {}
+
+        for field, (value, quote, confidence) in rule_results.items():
+            if confidence >= RULE_MIN_CONFIDENCE:
+                key = field.lower().replace(" ", "_")
+                extracted[key] = value
+                quotes[key] = quote
+
+        unresolved = [f for f in FIELDS if f.lower().replace(" ", "_") not in extracted]
+        model_answered = True
+        if unresolved:
+            progress(0.5, f"Asking the model for {len(unresolved)} field(s)")
+            with stage('llm_extract'):
+                field_results = ask_all_fields(text, unresolved)
+            model_answered = bool(field_results)
             for result in field_results:
                 raw_key = result.get("key", "").strip().lower().replace(" ", "_")
+                if raw_key in extracted:
+                    continue
                 extracted[raw_key] = result.get("value", "").strip()
                 quotes[raw_key] = result.get("quote", "").strip()
-    
-            return extracted, quotes
-        except Exception as e:
-            extracted = {'effective_date': '', 'maturity_date': '', 'frequency': '', 'amortization_type': '', 'loan_rate': '', 'balance': ''}
-            quotes = {'effective_date': '', 'maturity_date': '', 'frequency': '', 'amortization_type': '', 'loan_rate': '', 'balance': ''}
-            return extracted, quotes
 
-def contains_any(text, keywords):
-    return any(kw in text for kw in keywords)
+            # Low-confidence rule matches still beat nothing (e.g. offline)
+            for field in unresolved:
+                key = field.lower().replace(" ", "_")
+                if not extracted.get(key) and field in rule_results:
+                    extracted[key], quotes[key], _ = rule_results[field]
+
+        # Failed or empty model answers are not cached so the next upload retries
+        if extracted and model_answered:
+            cache.put_fields(sha256, MODEL_KEY, extracted, quotes)
+        return extracted, quotes
+    except Exception:
+        record_error('extract')
+        extracted = {'effective_date': '', 'maturity_date': '', 'frequency': '', 'amortization_type': '', 'loan_rate': '', 'balance': ''}
+        quotes = {'effective_date': '', 'maturity_date': '', 'frequency': '', 'amortization_type': '', 'loan_rate': '', 'balance': ''}
+        return extracted, quotes
 
 def chat_reply(user_input, break_funding_cost):
-    ftp_keywords = ["ftp", "fund transfer pricing", "transfer price", "transfer pricing"]
-    break_funding_keywords = ["break-funding", "break funding", "break cost", "prepay penalty", "breakfund", "break-fund", "break fund"]
-    impact_keywords = ["impact", "cost", "effect", "calculate", "calculation", "savings", "reduction"]
-    irrelevant_keywords = ["car", "color", "colour", "weather"]
+    """
+    Answer a chat question: a routed intent's canned answer, else a cached
+    answer to the same (or a near-identical) question, else the model.
+    """
     try:
-        text = user_input.lower().strip()
-        if contains_any(text, irrelevant_keywords):
-            response_text = (
-                "I'm an expert in bank treasury finance and I'm here to answer your questions related to break-funding and fund transfer pricing. I'm sorry, but I cannot answer your question as it is not related to my area of expertise."
-            )
+        intent, response_text = route(user_input, break_funding_cost)
+        if response_text is not None:
+            CHAT_ANSWERS.inc(source=intent)
             return response_text
-        elif contains_any(text, impact_keywords):
-            response_text = (
-                    "The calculation separates the loan’s interest into two parts: "
-                    "interest accrued before the prepayment date and interest accruing after. "
-                    "It then measures how the prepayment reduces the principal balance, creating prepaid principal cash flows. "
-                    "By comparing the original and adjusted schedules, it quantifies the impact of prepayment on both principal and interest payments. "
-                )
-            if break_funding_cost is not None:
-                formatted_cost = f"${break_funding_cost:,.2f}"
-                response_text +=  "The resulting cash flow visualization clearly shows these components, and the total impact of the prepayment on the loan’s cost is " + formatted_cost + "."
-            return response_text
-        elif contains_any(text, break_funding_keywords):
-            return (
-                "Break-funding refers to the cost a bank incurs when a fixed-rate loan is prepaid before maturity. "
-                "It reflects the loss from having to reinvest the prepaid amount at lower current market rates compared to the original funding terms."
-            )
-        elif contains_any(text, ftp_keywords):
-            return (
-                "FTP stands for Fund Transfer Pricing. It is an internal system used by banks to allocate the cost of funds "
-                "to different business units, ensuring pricing transparency and incentivizing responsible risk and liquidity management."
-            )
-        else:
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an expert in bank treasury finance. "
-                        "Your job is to answer questions on break-funding and fund transfer pricing. "
-                        "Answer concisely. If not sure, say you are not sure. "
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": f"My question is: {user_input}"
-                }
-            ]    
-        
-            response = client.chat_completion(
-                messages=messages,
-                temperature=0,
-            )
 
-            content = response.choices[0].message.content.strip()
-            response_text = str(content)
+        response_text = answer_cache.get(user_input)
+        if response_text is not None:
+            CHAT_ANSWERS.inc(source='cache')
             return response_text
-    except Exception as e:
+
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "You are an expert in bank treasury finance. "
+                    "Your job is to answer questions on break-funding and fund transfer pricing. "
+                    "Answer concisely. If not sure, say you are not sure. "
+                )
+            },
+            {
+                "role": "user",
+                "content": f"My question is: {user_input}"
+            }
+        ]
+
+        with stage('llm_chat'):
+            content = llm.chat(messages, temperature=0).strip()
+        response_text = str(content)
+        answer_cache.put(user_input, response_text)
+        CHAT_ANSWERS.inc(source='model')
+        return response_text
+    except Exception:
+        record_error('llm_chat')
         return "Sorry, there was a problem generating a response."
\ No newline at end of file
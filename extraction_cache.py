@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_PATH = os.getenv("EXTRACTION_CACHE_PATH", ".cache/extraction.sqlite3")
+DEFAULT_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    sha256 TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    sha256 TEXT NOT NULL,
+    model_key TEXT NOT NULL,
+    extracted TEXT NOT NULL,
+    quotes TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (sha256, model_key)
+);
+CREATE INDEX IF NOT EXISTS documents_last_used ON documents (last_used);
+CREATE INDEX IF NOT EXISTS fields_last_used ON fields (last_used);
+"""
+
+
+def content_hash(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+class ExtractionCache:
+    """
+    On-disk SQLite cache of PDF extraction results keyed by content hash.
+
+    Extracted text is stored per document (SHA-256 of the PDF bytes); field
+    values and quotes are stored per (document, model/prompt version) so a
+    prompt change re-asks the model but reuses the parsed text. Once the
+    stored payload exceeds `max_bytes`, least recently used entries are
+    evicted. Each call opens its own connection, so one file can be shared
+    by several worker processes.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_text(self, sha256):
+        with self._connect() as conn:
+            row = conn.execute("SELECT text FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE documents SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+            return row[0]
+
+    def put_text(self, sha256, text):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (sha256, text, size, last_used) VALUES (?, ?, ?, ?)",
+                (sha256, text, len(text.encode('utf-8')), time.time()),
+            )
+            self._evict(conn)
+
+    def get_fields(self, sha256, model_key):
+        """
+        Return (extracted, quotes) dicts or None on a miss.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT extracted, quotes FROM fields WHERE sha256 = ? AND model_key = ?",
+                (sha256, model_key),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE fields SET last_used = ? WHERE sha256 = ? AND model_key = ?",
+                (time.time(), sha256, model_key),
+            )
+            return json.loads(row[0]), json.loads(row[1])
+
+    def put_fields(self, sha256, model_key, extracted, quotes):
+        extracted_json = json.dumps(extracted)
+        quotes_json = json.dumps(quotes)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fields (sha256, model_key, extracted, quotes, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (sha256, model_key, extracted_json, quotes_json,
+                 len(extracted_json) + len(quotes_json), time.time()),
+            )
+            self._evict(conn)
+
+    def total_bytes(self, conn=None):
+        if conn is None:
+            with self._connect() as conn:
+                return self.total_bytes(conn)
+        documents = conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+        fields = conn.execute("SELECT COALESCE(SUM(size), 0) FROM fields").fetchone()[0]
+        return documents + fields
+
+    def _evict(self, conn):
+        excess = self.total_bytes(conn) - self.max_bytes
+        if excess <= 0:
+            return
+        # Drop least recently used entries across both tables until under budget
+        rows = conn.execute(
+            "SELECT 'documents', sha256, '', size, last_used FROM documents "
+            "UNION ALL SELECT 'fields', sha256, model_key, size, last_used FROM fields "
+            "ORDER BY last_used"
+        ).fetchall()
+        for table, sha256, model_key, size, _ in rows:
+            if excess <= 0:
+                break
+            if table == 'documents':
+                conn.execute("DELETE FROM documents WHERE sha256 = ?", (sha256,))
+            else:
+                conn.execute("DELETE FROM fields WHERE sha256 = ? AND model_key = ?", (sha256, model_key))
+            excess -= size
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM fields")
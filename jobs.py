@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", ".cache/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_TTL = int(os.getenv("JOB_TTL", 24 * 3600))  # seconds a finished job is kept
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated);
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed job table. Any worker process can read a job's status, even
+    though the job runs in the process that accepted it.
+    """
+
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, kind):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, now, now),
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        fields['updated'] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def prune(self, max_age=JOB_TTL):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE updated < ?", (time.time() - max_age,))
+
+
+class JobQueue:
+    """
+    Runs jobs on a local thread pool and records their progress in a JobStore.
+
+    A job function is called as fn(*args, progress=callback) where
+    callback(fraction, message) records progress; its JSON-serializable return
+    value becomes the job result.
+    """
+
+    def __init__(self, store=None, max_workers=JOB_WORKERS):
+        self.store = store or JobStore()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, kind, fn, *args):
+        self.store.prune()
+        job_id = self.store.create(kind)
+        self._executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def status(self, job_id):
+        return self.store.get(job_id)
+
+    def _run(self, job_id, fn, args):
+        def progress(fraction, message=''):
+            self.store.update(job_id, progress=fraction, message=message)
+
+        self.store.update(job_id, status=RUNNING)
+        try:
+            result = fn(*args, progress=progress)
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            self.store.update(job_id, status=FAILED, error=str(e))
+        else:
+            self.store.update(job_id, status=DONE, progress=1.0, message='Done', result=result)
@@ -0,0 +1,156 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from cache import hash_key
+from metrics import LLM_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 20))  # seconds per attempt
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", 0.5))  # seconds, doubled per retry
+LLM_MAX_PENDING = int(os.getenv("LLM_MAX_PENDING", 16))  # distinct calls queued or running
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class LLMTimeoutError(TimeoutError):
+    pass
+
+
+class LLMOverloadedError(RuntimeError):
+    pass
+
+
+def is_retryable(error):
+    """
+    Transport errors and timeouts (no HTTP response) and throttling/server
+    errors are retried; other client errors are not.
+    """
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        return True
+    return status in RETRYABLE_STATUS
+
+
+class LLMGateway:
+    """
+    Bounded, non-blocking front for a chat completion client.
+
+    Calls run on a thread pool of `max_concurrency` workers, so a slow
+    endpoint can occupy at most that many threads. Each attempt is limited by
+    the client's own timeout. Transient failures are retried with
+    exponential backoff and jitter. Identical requests already in flight share
+    one call. Callers wait at most `deadline` seconds and then get an
+    LLMTimeoutError; once every caller of a call has given up, it is
+    cancelled if still queued and not retried if running. At most
+    `max_pending` distinct calls are queued or running; further ones are
+    rejected with LLMOverloadedError instead of queueing behind them.
+    """
+
+    def __init__(self, client, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, backoff=LLM_BACKOFF, deadline=None,
+                 max_pending=LLM_MAX_PENDING):
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.deadline = deadline or timeout * (max_retries + 1) + backoff * (2 ** max_retries)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._in_flight = {}
+        self._waiters = {}
+        # Reentrant: cancelling a future runs its done callback, which takes the lock
+        self._lock = threading.RLock()
+        self.calls = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    def submit(self, messages, **kwargs):
+        """
+        Start a chat completion and return a Future of the message content.
+        Joins an identical in-flight request instead of starting a new one.
+        Raises LLMOverloadedError when `max_pending` calls are already pending.
+        """
+        key = hash_key(messages, kwargs)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                self._waiters[key] += 1
+                return future
+            if not self._slots.acquire(blocking=False):
+                self.rejected += 1
+                raise LLMOverloadedError(f"{self.max_pending} LLM calls already pending")
+            future = self._executor.submit(self._call_with_retries, key, messages, kwargs)
+            self._in_flight[key] = future
+            self._waiters[key] = 1
+            self.calls += 1
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def chat(self, messages, deadline=None, **kwargs):
+        """
+        Blocking convenience wrapper around submit() with a deadline.
+        """
+        deadline = deadline or self.deadline
+        key = hash_key(messages, kwargs)
+        future = self.submit(messages, **kwargs)
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeout:
+            self._give_up(key, future)
+            raise LLMTimeoutError(f"LLM did not answer within {deadline:g}s")
+
+    def _give_up(self, key, future):
+        """
+        One caller stopped waiting; the last one out cancels a queued call.
+        """
+        with self._lock:
+            if self._in_flight.get(key) is not future:
+                return
+            self._waiters[key] -= 1
+            if self._waiters[key] == 0 and future.cancel():
+                self.cancelled += 1
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+                del self._waiters[key]
+            self._slots.release()
+
+    def _abandoned(self, key):
+        with self._lock:
+            return self._waiters.get(key) == 0
+
+    def _call_with_retries(self, key, messages, kwargs):
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.client.chat_completion(messages=messages, **kwargs)
+                LLM_SECONDS.observe(time.perf_counter() - start, outcome='ok')
+                return response.choices[0].message.content
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                # Nobody is waiting for the answer any more: do not retry
+                if attempt >= self.max_retries or not is_retryable(e) or self._abandoned(key):
+                    LLM_SECONDS.observe(elapsed, outcome='error')
+                    logger.warning("LLM call failed after %d attempt(s): %s", attempt + 1, e)
+                    raise
+                LLM_SECONDS.observe(elapsed, outcome='retry')
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                logger.info("LLM attempt %d failed after %.2fs (%s); retrying in %.2fs",
+                            attempt + 1, elapsed, e, delay)
+                time.sleep(delay)
+                attempt += 1
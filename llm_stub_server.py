@@ -0,0 +1,101 @@
+"""
+Local stand-in for the Hugging Face chat completion endpoint.
+
+Answers POST /v1/chat/completions with an OpenAI-style response so the app,
+timeouts, retries and coalescing can be exercised without network access:
+
+    python llm_stub_server.py --port 8081 --delay 0.5 --fail-rate 0.2
+    python llm_stub_server.py --fail-first 2   # first two requests get a 503
+    export HF_ENDPOINT_URL=http://127.0.0.1:8081
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_REPLY = "I am a local stub model."
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    fail_rate = 0.0
+    fail_first = 0
+    reply = DEFAULT_REPLY
+    requests_seen = 0
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        with self._lock:
+            type(self).requests_seen += 1
+            seen = self.requests_seen
+
+        time.sleep(self.delay)
+        if seen <= self.fail_first or random.random() < self.fail_rate:
+            self._send(503, {'error': 'stub overloaded'})
+            return
+
+        model = payload.get('model') or 'stub'
+        self._send(200, {
+            'id': 'stub-completion',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': self.reply},
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        })
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, delay=0.0, fail_rate=0.0, reply=DEFAULT_REPLY, fail_first=0):
+    """
+    Start the stub in a background thread. Returns (server, base_url); call
+    server.shutdown() when done. Port 0 picks a free port. The number of
+    requests answered so far is server.RequestHandlerClass.requests_seen.
+    """
+    handler = type('ConfiguredStubHandler', (StubHandler,), {
+        'delay': delay, 'fail_rate': fail_rate, 'fail_first': fail_first, 'reply': reply, 'requests_seen': 0,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub chat completion endpoint.")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument('--fail-first', type=int, default=0, help="answer the first N requests with 503")
+    parser.add_argument('--reply', default=DEFAULT_REPLY, help="assistant message content to return")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.delay, args.fail_rate, args.reply, args.fail_first)
+    print(f"Stub LLM listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import json
+import math
+import re
+from dateutil import parser
+
+from calendars import DAY_COUNTS, available_calendars
+
+
+FIELDS = [
+    'effective_date', 'maturity_date', 'frequency', 'amortization_type',
+    'loan_rate', 'balance'
+]
+
+def safe_field(field_name, extracted, form):
+    """
+    The safe_field() function is a helper that prioritizes user input, but falls back 
+    to extracted values (like from a PDF), and if neither is available, returns a 
+    blank string.
+    """
+    user_val = form.get(field_name)
+    extracted_val = extracted.get(field_name, "")
+    if user_val is not None and user_val.strip() != "":
+        return user_val.strip()
+    elif extracted_val not in (None, "", "None"):
+        return extracted_val
+    else:
+        return ""
+
+def normalize_date(date_str):
+    try:
+        dt = parser.parse(date_str)
+        return dt.strftime("%Y-%m-%d")
+    except Exception:
+        return ""
+
+def normalize_frequency(freq_str):
+    freq_str = freq_str.strip().lower()
+    mapping = {
+        'monthly': 'monthly',
+        'month': 'monthly',
+        'quarterly': 'quarterly',
+        'quarter': 'quarterly',
+        '3m': 'quarterly',
+        'semiannual': 'semiannual',
+        'semi-annually': 'semiannual',
+        '6m': 'semiannual',
+        'annual': 'annual',
+        'yearly': 'annual',
+        '12m': 'annual'
+    }
+    return mapping.get(freq_str, '')
+
+def normalize_amortization_type(amt_str):
+    amt_str = amt_str.strip().lower()
+    mapping = {
+        'interest only': 'interest only',
+        'io': 'interest only',
+        'i/o': 'interest only',
+
+        'equal': 'equal',
+        'equal payment': 'equal',
+        'annuity': 'equal',
+        'level payment': 'equal',
+
+        'linear': 'linear',
+        'straight line': 'linear',
+        'even principal': 'linear',
+        'constant principal': 'linear',
+
+        'custom': 'custom',
+        'manual': 'custom',
+        'user defined': 'custom',
+    }
+    return mapping.get(amt_str, '')
+
+
+def normalize_prepayment_mode(mode_str):
+    mode_str = mode_str.strip().lower().replace('-', ' ').replace('_', ' ')
+    mapping = {
+        'backload': 'backload',
+        'reduce installment': 'reduce_installment',
+        'reduce payment': 'reduce_installment',
+        'shorten term': 'shorten_term',
+        'reduce term': 'shorten_term',
+    }
+    return mapping.get(mode_str, '')
+
+
+def normalize_day_count(day_count_str):
+    day_count_str = day_count_str.strip().upper().replace(' ', '')
+    aliases = {'ACT/365': 'ACT/365F', 'ACT/365FIXED': 'ACT/365F', '30/360US': '30/360', 'PERIODIC': 'periodic'}
+    day_count_str = aliases.get(day_count_str, day_count_str)
+    return day_count_str if day_count_str in DAY_COUNTS else ''
+
+
+def normalize_calendar(calendar_str):
+    calendar_str = calendar_str.strip().lower()
+    return calendar_str if calendar_str in available_calendars() else ''
+
+
+def normalize_custom_principal(value):
+    """
+    Inline custom principal schedule: a list (optionally wrapped as
+    {"schedule": [...]}), or a string holding JSON or ';'-separated amounts
+    (e.g. a CSV cell). Returns '' if unreadable or an amount is negative.
+    """
+    text = value.strip() if isinstance(value, str) else ''
+    if text.startswith(('[', '{')):
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return ''
+    if isinstance(value, dict):
+        value = value.get('schedule')
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if not isinstance(value, str):
+        return ''
+    amounts = [parse_signed_amount(part) for part in text.split(';') if part.strip()]
+    return amounts if amounts and None not in amounts and min(amounts) >= 0 else ''
+
+
+# Optional pricing inputs: normalizer and error message
+OPTIONAL_FIELDS = {
+    'prepayment_mode': (normalize_prepayment_mode, "Unknown prepayment mode."),
+    'day_count': (normalize_day_count, "Unknown day count."),
+    'calendar': (normalize_calendar, "Unknown holiday calendar."),
+    'custom_principal': (normalize_custom_principal, "Custom principal schedule is not a list of non-negative amounts."),
+}
+
+
+# Normalize/parse balance as float (handle commas, $ signs)
+def parse_amount(s):
+    if not s:
+        return None
+    s = re.sub(r'[^\d.]', '', s)
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+def parse_signed_amount(s):
+    """
+    Like parse_amount, but keeps the sign: '-100', '$-100', '($100)' and
+    '100-' are -100. For schedules, where a negative amount must be rejected rather
+    than read as positive.
+    """
+    if not s:
+        return None
+    s = s.strip()
+    lead = re.match(r"[^\d]*", s).group()
+    negative = '-' in lead or s.endswith('-') or ('(' in lead and s.endswith(')'))
+    amount = parse_amount(s)
+    if amount is None:
+        return None
+    return -amount if negative else amount
+
+PREPAYMENT_FIELDS = ['prepayment_date', 'prepayment_amount']
+NUMERIC_FIELDS = ['loan_rate', 'balance', 'prepayment_amount']
+
+
+def parse_number(value):
+    """
+    Finite float from a JSON number or numeric string, else None.
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value.strip() if isinstance(value, str) else value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def normalize_loan(values, fields=None):
+    """
+    Validate and normalize loan inputs from a machine client (JSON object or
+    CSV row) with the same helpers the form uses. `fields` defaults to the
+    loan terms plus the prepayment fields.
+
+    Returns (data, errors): keyword arguments for compute_break_funding_cost,
+    and a {field: message} dict that is empty when every field is valid.
+    OPTIONAL_FIELDS are normalized and passed through when present
+    ('prepayment_mode' only when prepayment fields are requested).
+    """
+    data = {}
+    errors = {}
+    for field in fields or FIELDS + PREPAYMENT_FIELDS:
+        value = values.get(field)
+        if value is None or str(value).strip() in ('', 'None'):
+            errors[field] = "This field is required."
+        elif field in NUMERIC_FIELDS:
+            data[field] = parse_number(value)
+            if data[field] is None:
+                errors[field] = "Must be a number."
+        elif field == 'frequency':
+            data[field] = normalize_frequency(str(value))
+            if not data[field]:
+                errors[field] = "Unknown frequency."
+        elif field == 'amortization_type':
+            data[field] = normalize_amortization_type(str(value))
+            if not data[field]:
+                errors[field] = "Unknown amortization type."
+        else:
+            data[field] = normalize_date(str(value))
+            if not data[field]:
+                errors[field] = "Not a valid date."
+
+    for field, (normalize, message) in OPTIONAL_FIELDS.items():
+        value = values.get(field)
+        if value in (None, '') or (field == 'prepayment_mode' and 'prepayment_amount' not in (fields or PREPAYMENT_FIELDS)):
+            continue
+        if field == 'custom_principal':
+            data[field] = normalize(value if isinstance(value, (list, tuple, dict)) else str(value))
+        elif isinstance(value, str):
+            data[field] = normalize(value)
+        else:
+            errors[field] = message  # e.g. a JSON list where a name is expected
+            continue
+        if not data[field]:
+            errors[field] = message
+    return data, errors
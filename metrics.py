@@ -0,0 +1,336 @@
+"""
+Hot-path instrumentation: per-stage timers, counters and histograms exposed
+at /metrics in the Prometheus text format, JSON request logs carrying a
+request id, and an opt-in sampling profiler per request.
+
+    with stage('pricing'):
+        cost = compute_break_funding_cost(**data)
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger('breakfunding.requests')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Caller-supplied X-Request-IDs are kept only when they look like an id
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+# ?profile=1 (or an X-Profile: 1 header) samples the request's stack when
+# PROFILE_REQUESTS is set; collapsed stacks are written to PROFILE_DIR
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "").lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))  # seconds between samples
+
+# Request log lines go to stderr unless the deployment already routes the
+# 'breakfunding.requests' logger itself; REQUEST_LOG=0 turns them off
+REQUEST_LOG = os.getenv("REQUEST_LOG", "1").lower() in ('1', 'true', 'yes')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels.
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, self.labelnames, key, value) for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram (Prometheus semantics) with optional labels.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            row = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(row) for key, row in self._values.items()}
+        names = self.labelnames + ('le',)
+        samples = []
+        for key, row in sorted(values.items()):
+            for bound, count in zip(self.buckets, row):
+                samples.append((f'{self.name}_bucket', names, key + (_format_value(bound),), count))
+            samples.append((f'{self.name}_bucket', names, key + ('+Inf',), row[-1]))
+            samples.append((f'{self.name}_sum', self.labelnames, key, row[-2]))
+            samples.append((f'{self.name}_count', self.labelnames, key, row[-1]))
+        return samples
+
+
+class Registry:
+    """
+    Metrics plus collector callbacks, rendered together by render().
+
+    A collector returns (name, type, help, [(labels dict, value), ...])
+    tuples read at scrape time, e.g. cache sizes and hit rates.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labelnames, key, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labelnames, key)} {_format_value(value)}')
+
+        families = {}
+        for collect in self._collectors:
+            try:
+                for name, kind, documentation, samples in collect():
+                    families.setdefault(name, (kind, documentation, []))[2].extend(samples)
+            except Exception:
+                logger.exception("Metrics collector %r failed", collect)
+        for name, (kind, documentation, samples) in families.items():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    'breakfunding_requests_total', "HTTP requests by endpoint, method and status.", ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = REGISTRY.histogram(
+    'breakfunding_request_seconds', "HTTP request latency.", ('endpoint',))
+STAGE_SECONDS = REGISTRY.histogram(
+    'breakfunding_stage_seconds', "Time spent in each instrumented stage.", ('stage',))
+ERRORS = REGISTRY.counter(
+    'breakfunding_errors_total', "Handled exceptions per stage, unhandled ones per endpoint.", ('stage',))
+LLM_SECONDS = REGISTRY.histogram(
+    'breakfunding_llm_call_seconds', "Latency of each model call attempt.", ('outcome',))
+CHAT_ANSWERS = REGISTRY.counter(
+    'breakfunding_chat_answers_total', "Chat answers by source: the routed intent's name, 'cache' or 'model'.",
+    ('source',))
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a block as stage `name`: observed in STAGE_SECONDS and added to the
+    current request's stage timings. Errors are counted where they are
+    handled (record_error) or, if unhandled, per endpoint by init_app.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if has_request_context():
+            timings = g.setdefault('stage_timings', {})
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def record_error(stage_name):
+    """
+    Count an exception that was handled (turned into a message) instead of raised.
+    """
+    ERRORS.inc(stage=stage_name)
+    request_id = g.get('request_id', '-') if has_request_context() else '-'
+    logger.exception("Error in stage %s (request %s)", stage_name, request_id)
+
+
+def register_cache(name, info):
+    """
+    Report an LRUCache (anything whose info() returns hits, misses,
+    evictions, size and hit_rate) as breakfunding_cache_* metrics.
+    """
+    def collect():
+        stats = info()
+        labels = {'cache': name}
+        return [
+            ('breakfunding_cache_hits_total', 'counter', "Cache hits.", [(labels, stats['hits'])]),
+            ('breakfunding_cache_misses_total', 'counter', "Cache misses.", [(labels, stats['misses'])]),
+            ('breakfunding_cache_evictions_total', 'counter', "Cache evictions.", [(labels, stats['evictions'])]),
+            ('breakfunding_cache_entries', 'gauge', "Entries currently cached.", [(labels, stats['size'])]),
+            ('breakfunding_cache_hit_ratio', 'gauge', "Hits over lookups since the last clear.",
+             [(labels, stats['hit_rate'])]),
+        ]
+    REGISTRY.register_collector(collect)
+
+
+class StackSampler:
+    """
+    Sampling profiler for one thread: a daemon thread records the target
+    thread's stack every `interval` seconds. Overhead is independent of how
+    many Python calls the request makes. Results are collapsed stacks
+    ("outer;inner;leaf count"), the input format of flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = StackCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='stack-sampler')
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _wants_profile():
+    flag = request.args.get('profile') or request.headers.get('X-Profile', '')
+    return PROFILE_REQUESTS and flag.lower() in ('1', 'true', 'yes')
+
+
+def init_app(app):
+    """
+    Give every request an id (the caller's X-Request-ID if it is a plain
+    id, else a new one; echoed back), count and time it, log one JSON line with its stage timings, and
+    serve REGISTRY at /metrics.
+    """
+    if REQUEST_LOG and not request_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        request_logger.addHandler(handler)
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False  # the line is already complete JSON
+
+    @app.before_request
+    def start_request():
+        request_id = request.headers.get('X-Request-ID', '')
+        g.request_id = request_id if REQUEST_ID_PATTERN.fullmatch(request_id) else uuid.uuid4().hex
+        g.request_start = time.perf_counter()
+        g.stage_timings = {}
+        g.sampler = StackSampler(threading.get_ident()).start() if _wants_profile() else None
+
+    @app.after_request
+    def finish_request(response):
+        elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+        endpoint = request.endpoint or 'unmatched'
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+
+        entry = {
+            'event': 'request',
+            'request_id': g.get('request_id'),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'stages_ms': {name: round(t * 1000, 2) for name, t in g.get('stage_timings', {}).items()},
+        }
+        sampler = g.pop('sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            # Named by the server, never by the caller's request id
+            path = os.path.join(PROFILE_DIR, f"{uuid.uuid4().hex}.folded")
+            with open(path, 'w') as f:
+                f.write(sampler.collapsed())
+            entry['profile'] = path
+            response.headers['X-Profile'] = path
+        request_logger.info(json.dumps(entry))
+        return response
+
+    @app.teardown_request
+    def stop_sampler(exc):
+        if exc is not None:
+            ERRORS.inc(stage=request.endpoint or 'unmatched')
+        # after_request is skipped when a view raises; do not leak the thread
+        sampler = g.pop('sampler', None)
+        if sampler is not None:
+            sampler.stop()
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return app.response_class(REGISTRY.render(), mimetype=CONTENT_TYPE)
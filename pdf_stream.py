@@ -0,0 +1,82 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+
+
+MAX_PDF_BYTES = int(os.getenv("MAX_PDF_BYTES", 50 * 1024 * 1024))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", 1))
+PARALLEL_MIN_PAGES = 32  # smaller documents are not worth a process pool
+PAGES_PER_TASK = 8
+SPOOL_CHUNK = 1024 * 1024
+
+
+@contextmanager
+def spool_upload(stream, max_bytes=MAX_PDF_BYTES):
+    """
+    Copy an upload stream to a temporary file in fixed-size chunks, hashing
+    it on the way. Yields (path, sha256 hex digest) and deletes the file on
+    exit. Uploads larger than `max_bytes` raise ValueError.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    spool = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    try:
+        with spool:
+            while True:
+                chunk = stream.read(SPOOL_CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"PDF is larger than {max_bytes / (1024 * 1024):g} MB")
+                digest.update(chunk)
+                spool.write(chunk)
+        yield spool.name, digest.hexdigest()
+    finally:
+        os.remove(spool.name)
+
+
+def page_count(path):
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def _page_range_text(path, start, stop):
+    # Worker entry point: each process opens the file on its own
+    with fitz.open(path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def iter_page_texts(path, workers=PDF_WORKERS):
+    """
+    Lazily yield the text of each page in order.
+
+    The document is opened from disk, so MuPDF loads pages on demand instead
+    of holding the whole upload in memory. With workers > 1 and a long
+    document, page ranges are extracted in a process pool, with a bounded
+    number of ranges in flight. Closing the generator early cancels the
+    remaining work.
+    """
+    pages = page_count(path)
+    if workers <= 1 or pages < PARALLEL_MIN_PAGES:
+        with fitz.open(path) as doc:
+            for page in doc:
+                yield page.get_text()
+        return
+
+    ranges = [(start, min(start + PAGES_PER_TASK, pages)) for start in range(0, pages, PAGES_PER_TASK)]
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = []
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < workers * 2:
+                pending.append(pool.submit(_page_range_text, path, *ranges[next_range]))
+                next_range += 1
+            yield from pending.pop(0).result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,368 @@
+import csv
+import os
+
+import numpy as np
+
+from calculations import NON_FINITE_COST, compute_break_funding_cost
+from curves import default_curve
+from risk import BUMP, key_tenors_for, loan_risk, reduction_deltas
+from loan_inputs import normalize_calendar, normalize_custom_principal, normalize_day_count, normalize_prepayment_mode
+from schedule import (
+    CUSTOM_SCHEDULE_ERROR, CUSTOM_SCHEDULE_MISSING, FREQ_MONTHS, custom_principal_vector,
+    payment_dates, principal_interest_matrix, round_cents,
+)
+
+
+LOAN_COLUMNS = [
+    'effective_date', 'maturity_date', 'frequency', 'amortization_type',
+    'loan_rate', 'balance', 'prepayment_date', 'prepayment_amount'
+]
+
+# Per-loan error codes returned by price_portfolio ('' means priced)
+ERROR_CODES = {
+    'invalid_date': "Date is missing or not in YYYY-MM-DD format.",
+    'invalid_number': "Rate, balance or prepayment amount is not numeric.",
+    'invalid_frequency': "Invalid frequency",
+    'invalid_amortization': "Unknown amortization type",
+    'missing_custom_schedule': CUSTOM_SCHEDULE_MISSING,
+    'invalid_custom_schedule': CUSTOM_SCHEDULE_ERROR,
+    'invalid_term': "Maturity date must be after effective date",
+    'prepayment_after_maturity': "Prepayment date is beyond loan maturity.",
+    'prepayment_exceeds_balance': "Prepayment amount exceeds remaining balance.",
+    'invalid_prepayment_mode': "Unknown prepayment mode",
+    'invalid_day_count': "Unknown day count",
+    'invalid_calendar': "Unknown holiday calendar",
+    'non_finite_cost': NON_FINITE_COST,
+    'invalid_input': "Loan could not be priced.",  # any other pricing error
+}
+_ERROR_MESSAGES = {message: code for code, message in ERROR_CODES.items()}
+
+
+def error_code(exc):
+    """
+    ERROR_CODES key for an exception raised while pricing a loan;
+    'invalid_input' for messages that are not one of ERROR_CODES.
+    """
+    return _ERROR_MESSAGES.get(str(exc), 'invalid_input')
+
+# Optional per-loan pricing options: normalizer, the value the vectorized
+# pass assumes, and the error code for unreadable values. Loans asking for
+# anything else are priced one by one with compute_break_funding_cost.
+PRICING_OPTIONS = {
+    'prepayment_mode': (normalize_prepayment_mode, 'backload', 'invalid_prepayment_mode'),
+    'day_count': (normalize_day_count, 'periodic', 'invalid_day_count'),
+    'calendar': (normalize_calendar, None, 'invalid_calendar'),  # any calendar adjusts dates
+}
+
+# Loans handled per vectorized pass; bounds memory to chunk x periods
+ROW_CHUNK = 4096
+
+
+def load_loan_table(source):
+    """
+    Normalize a loan book into a dict of column lists.
+
+    Accepts a dict of columns (lists or arrays), a list of per-loan dicts
+    (records) or the path of a CSV file with a header row.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='') as f:
+            source = list(csv.DictReader(f))
+
+    if isinstance(source, dict):
+        table = {key: list(values) for key, values in source.items()}
+    else:
+        records = list(source)
+        # Optional columns may be set on some records only
+        keys = list(dict.fromkeys(key for record in records for key in record)) if records else LOAN_COLUMNS
+        table = {key: [record.get(key) for record in records] for key in keys}
+
+    missing = [col for col in LOAN_COLUMNS if col not in table]
+    if missing:
+        raise ValueError(f"Loan table is missing columns: {', '.join(missing)}")
+
+    lengths = {len(table[col]) for col in LOAN_COLUMNS}
+    if len(lengths) > 1:
+        raise ValueError("Loan table columns have different lengths")
+    return table
+
+
+def _parse_dates(values, errors):
+    try:
+        parsed = np.array(values, dtype='datetime64[D]')
+    except (TypeError, ValueError):
+        parsed = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[D]')
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = np.datetime64(str(value).strip(), 'D')
+            except ValueError:
+                pass
+    errors[np.isnat(parsed) & (errors == '')] = 'invalid_date'
+    return parsed
+
+
+def _parse_numbers(values, errors):
+    try:
+        parsed = np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        parsed = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+    errors[np.isnan(parsed) & (errors == '')] = 'invalid_number'
+    return parsed
+
+
+def _lower(values):
+    return np.array([str(v).strip().lower() if v is not None else '' for v in values], dtype=object)
+
+
+def _period_counts(effective, maturity, prepayment, step):
+    """
+    Number of periods and first period starting on or after the prepayment
+    date for loans sharing one payment frequency.
+
+    Period start dates follow schedule.date_grid (day clipping accumulates),
+    built for ROW_CHUNK loans at a time.
+    """
+    count = len(effective)
+    num_periods = np.zeros(count, dtype=int)
+    prepay_index = np.zeros(count, dtype=int)
+
+    start_month = effective.astype('datetime64[M]')
+    start_day = (effective - start_month.astype('datetime64[D]')).astype(int) + 1
+    total_months = (maturity.astype('datetime64[M]') - start_month).astype(int)
+
+    for lo in range(0, count, ROW_CHUNK):
+        hi = min(lo + ROW_CHUNK, count)
+        width = max(int(total_months[lo:hi].max()) // step + 2, 1)
+        months = start_month[lo:hi, None] + np.arange(width) * step
+        month_starts = months.astype('datetime64[D]')
+        month_lengths = ((months + 1).astype('datetime64[D]') - month_starts).astype(int)
+        month_lengths[:, 0] = start_day[lo:hi]
+        days = np.minimum(start_day[lo:hi, None], np.minimum.accumulate(month_lengths, axis=1))
+        grid = month_starts + (days - 1)
+
+        n = (grid < maturity[lo:hi, None]).sum(axis=1)
+        in_term = np.arange(width) < n[:, None]
+        num_periods[lo:hi] = n
+        prepay_index[lo:hi] = ((grid < prepayment[lo:hi, None]) & in_term).sum(axis=1)
+
+    return num_periods, prepay_index
+
+
+def _discount_factor_rows(curve, prepayment, num_periods, step):
+    """
+    One row of curve discount factors per loan, looked up once per distinct
+    prepayment date through the curve's cache.
+    """
+    dates, inverse = np.unique(prepayment, return_inverse=True)
+    factors = np.stack([curve.discount_factors(d, step, num_periods) for d in dates])
+    return factors[inverse]
+
+
+def _pricing_options(table, errors):
+    """
+    {row: {option: value}} for loans asking for a non-default PRICING_OPTIONS
+    value. Unreadable values get the option's error code.
+    """
+    options = {}
+    for column, (normalize, default, code) in PRICING_OPTIONS.items():
+        for row, value in enumerate(table.get(column) or ()):
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                continue
+            if isinstance(value, str) and value.strip() in ('', 'None'):
+                continue
+            normalized = normalize(value) if isinstance(value, str) else ''
+            if not normalized:
+                if errors[row] == '':
+                    errors[row] = code
+            elif normalized != default:
+                options.setdefault(row, {})[column] = normalized
+    return options
+
+
+def _custom_schedules(column, rows, effective, maturity, step, balance, errors):
+    """
+    Validated per-period principal for the custom loans in `rows`, as a
+    {row: vector} dict. Rows without a readable schedule get an error code.
+    """
+    schedules = {}
+    for row in rows:
+        cell = column[row] if column is not None else None
+        if cell is None or (isinstance(cell, str) and not cell.strip()):
+            errors[row] = 'missing_custom_schedule'
+            continue
+        table = normalize_custom_principal(cell)
+        try:
+            if not table:
+                raise ValueError(CUSTOM_SCHEDULE_ERROR)
+            dates = payment_dates(str(effective[row]), str(maturity[row]), int(step[row]))
+            schedules[row] = custom_principal_vector(table, dates, balance[row])
+        except ValueError:
+            errors[row] = 'invalid_custom_schedule'
+    return schedules
+
+
+def _price_group(balance, loan_rate, amortization, prepay_index, prepayment_amount,
+                 prepayment, num_periods, step, curve, custom_principal=None):
+    """
+    Break-funding cost for loans sharing frequency and number of periods.
+    custom_principal holds one row per loan (NaN for non-custom loans).
+    Returns (costs, exceeds, reduction) where exceeds flags prepayments
+    larger than the outstanding principal and reduction is the prepaid
+    principal per period.
+    """
+    period_rate = loan_rate / 100 * step / 12
+    principal, interest = principal_interest_matrix(balance, period_rate, num_periods, amortization,
+                                                    custom_principal)
+    principal = round_cents(principal)
+    interest = round_cents(interest)
+
+    after_prepay = np.arange(num_periods) >= prepay_index[:, None]
+    remaining = np.where(after_prepay, principal, 0.0)
+    exceeds = prepayment_amount > remaining.sum(axis=1)
+
+    # Backload the prepayment: the last periods are reduced first
+    later = np.cumsum(remaining[:, ::-1], axis=1)[:, ::-1] - remaining
+    reduction = np.clip(prepayment_amount[:, None] - later, 0.0, remaining)
+    adjusted = principal - reduction
+
+    discount_factors = _discount_factor_rows(curve, prepayment, num_periods, step)
+    pv_original = ((principal + interest) * discount_factors).sum(axis=1)
+    pv_adjusted = ((adjusted + interest) * discount_factors).sum(axis=1)
+    return round_cents(pv_original - pv_adjusted), exceeds, reduction
+
+
+def price_portfolio(source, curve=None, risk=False, key_tenors=None, bump=BUMP):
+    """
+    Price the break-funding cost of every loan in a loan book.
+
+    `source` is anything load_loan_table accepts, with the same fields as
+    compute_break_funding_cost plus an optional 'loan_id' column. Loans are
+    grouped by frequency and number of periods and each group is priced in
+    one vectorized pass, discounting on `curve` (curves.default_curve() when
+    omitted). Loans with a non-default PRICING_OPTIONS value are priced one
+    by one with compute_break_funding_cost instead. Bad rows do not stop the
+    run: they get a NaN cost and a code from ERROR_CODES.
+
+    Returns a dict with 'loan_id', 'break_funding_cost' and 'error' arrays in
+    input order. With risk=True it also holds 'dv01' and a (loans x key
+    tenors) 'key_rate_deltas' array for `key_tenors` (default: the curve's
+    pillars), priced group by group with risk.reduction_deltas.
+    """
+    table = load_loan_table(source)
+    curve = curve or default_curve()
+    count = len(table['effective_date'])
+    errors = np.full(count, '', dtype=object)
+    costs = np.full(count, np.nan)
+    loan_ids = np.array(table.get('loan_id', range(count)), dtype=object)
+    if risk:
+        key_tenors = tuple(key_tenors or key_tenors_for(curve))
+        deltas = np.full((count, len(key_tenors) + 1), np.nan)
+
+    effective = _parse_dates(table['effective_date'], errors)
+    maturity = _parse_dates(table['maturity_date'], errors)
+    prepayment = _parse_dates(table['prepayment_date'], errors)
+    loan_rate = _parse_numbers(table['loan_rate'], errors)
+    balance = _parse_numbers(table['balance'], errors)
+    prepayment_amount = _parse_numbers(table['prepayment_amount'], errors)
+
+    frequency = _lower(table['frequency'])
+    amortization = _lower(table['amortization_type'])
+    step = np.array([FREQ_MONTHS.get(f, 0) for f in frequency])
+    errors[(step == 0) & (errors == '')] = 'invalid_frequency'
+    known = np.isin(amortization, ['interest only', 'equal', 'linear', 'custom'])
+    errors[~known & (errors == '')] = 'invalid_amortization'
+    options = _pricing_options(table, errors)
+
+    num_periods = np.zeros(count, dtype=int)
+    prepay_index = np.zeros(count, dtype=int)
+    for months in FREQ_MONTHS.values():
+        rows = np.flatnonzero((step == months) & (errors == ''))
+        if len(rows):
+            num_periods[rows], prepay_index[rows] = _period_counts(
+                effective[rows], maturity[rows], prepayment[rows], months
+            )
+
+    valid = errors == ''
+    errors[valid & (num_periods == 0)] = 'invalid_term'
+    valid = errors == ''
+    errors[valid & (prepay_index == num_periods)] = 'prepayment_after_maturity'
+    schedules = _custom_schedules(
+        table.get('custom_principal'), np.flatnonzero((amortization == 'custom') & (errors == '')),
+        effective, maturity, step, balance, errors
+    )
+
+    # Loans with non-default options, one by one
+    scalar = [row for row in options if errors[row] == '']
+    for row in scalar:
+        data = {
+            'effective_date': str(effective[row]),
+            'maturity_date': str(maturity[row]),
+            'frequency': frequency[row],
+            'amortization_type': amortization[row],
+            'loan_rate': loan_rate[row],
+            'balance': balance[row],
+            'prepayment_date': str(prepayment[row]),
+            'prepayment_amount': prepayment_amount[row],
+            **options[row],
+        }
+        if row in schedules:
+            data['custom_principal'] = schedules[row].tolist()
+        try:
+            if risk:
+                priced = loan_risk(data, curve, key_tenors, bump)
+                costs[row] = priced['break_funding_cost']
+                deltas[row] = [priced['dv01']] + [d['delta'] for d in priced['key_rate_deltas']]
+            else:
+                costs[row] = compute_break_funding_cost(**data, curve=curve)
+        except (ValueError, NotImplementedError) as e:
+            errors[row] = error_code(e)
+
+    # Sort the remaining loans by (frequency, periods) and price each run
+    vectorized = errors == ''
+    vectorized[scalar] = False
+    rows = np.flatnonzero(vectorized)
+    rows = rows[np.lexsort((num_periods[rows], step[rows]))]
+    keys = step[rows] * 100000 + num_periods[rows]
+    bounds = np.flatnonzero(np.diff(keys)) + 1
+
+    for group in np.split(rows, bounds) if len(rows) else []:
+        months, n = step[group[0]], num_periods[group[0]]
+        for lo in range(0, len(group), ROW_CHUNK):
+            chunk = group[lo:lo + ROW_CHUNK]
+            custom = None
+            if any(row in schedules for row in chunk):
+                custom = np.full((len(chunk), n), np.nan)
+                for i, row in enumerate(chunk):
+                    if row in schedules:
+                        custom[i] = schedules[row]
+            chunk_costs, exceeds, reduction = _price_group(
+                balance[chunk], loan_rate[chunk], amortization[chunk], prepay_index[chunk],
+                prepayment_amount[chunk], prepayment[chunk], n, months, curve, custom
+            )
+            costs[chunk] = np.where(exceeds, np.nan, chunk_costs)
+            errors[chunk[exceeds]] = 'prepayment_exceeds_balance'
+            if risk:
+                fits = ~exceeds
+                deltas[chunk[fits]] = reduction_deltas(
+                    reduction[fits], prepayment[chunk][fits], months, curve, key_tenors, bump
+                )
+
+    overflow = (errors == '') & ~np.isfinite(costs)
+    costs[overflow] = np.nan
+    errors[overflow] = 'non_finite_cost'
+
+    results = {
+        'loan_id': loan_ids,
+        'break_funding_cost': costs,
+        'error': errors,
+    }
+    if risk:
+        results['key_tenors'] = key_tenors
+        results['dv01'] = deltas[:, 0]
+        results['key_rate_deltas'] = deltas[:, 1:]
+    return results
@@ -0,0 +1,233 @@
+"""
+PowerPoint export for one loan or a whole batch.
+
+The slide design lives in a template deck whose first slide is the
+prototype: named shapes ('Title', 'Subtitle', 'Loan Details', 'Cost',
+'Chart area', 'Logo') that are copied onto every loan slide. The template is
+built (or read from PPT_TEMPLATE) once per worker and kept as bytes; each
+export parses a fresh copy.
+
+python-pptx looks up image parts, relationship ids and slide ids by scanning
+the whole package, which makes large decks quadratic. Loan slides are
+therefore appended directly: shapes are deep-copied XML, the logo image
+part is shared, and chart image parts get their own sequential part names.
+"""
+import copy
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from pptx import Presentation
+from pptx.dml.color import RGBColor
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.oxml.ns import qn
+from pptx.parts.image import Image, ImagePart
+from pptx.parts.slide import SlidePart
+from pptx.util import Inches, Pt
+
+
+PPT_TEMPLATE = os.getenv("PPT_TEMPLATE")  # optional .pptx whose first slide is the prototype
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'logo.png')
+PPTX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+
+BLANK_LAYOUT = 6
+DETAIL_LABELS = ("Effective Date", "Maturity Date", "Loan Rate", "Balance")
+
+
+def _textbox(slide, name, left, top, width, height, lines, size, bold=False, color=(0, 0, 0)):
+    box = slide.shapes.add_textbox(left, top, width, height)
+    box.name = name
+    frame = box.text_frame
+    for i, line in enumerate(lines):
+        paragraph = frame.paragraphs[0] if i == 0 else frame.add_paragraph()
+        run = paragraph.add_run()
+        run.text = line
+        run.font.size = Pt(size)
+        run.font.bold = bold
+        run.font.color.rgb = RGBColor(*color)
+    return box
+
+
+def build_template():
+    """
+    The default template deck: one prototype slide in the original export's
+    layout, with placeholder text that export fills per loan.
+    """
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[BLANK_LAYOUT])
+
+    _textbox(slide, 'Title', Inches(0.5), Inches(0.3), Inches(8), Inches(1),
+             ["Break-Funding Analysis"], 32, bold=True)
+    _textbox(slide, 'Subtitle', Inches(0.5), Inches(1), Inches(9), Inches(0.5),
+             ["The following summarizes key loan details:"], 20, bold=True,
+             color=(0, 112, 192))  # Bank of America Blue
+    # First paragraph left empty, like the original bullet list
+    _textbox(slide, 'Loan Details', Inches(0.5), Inches(1.4), Inches(4.5), Inches(2),
+             [""] + [f"{label}: " for label in DETAIL_LABELS], 18)
+    _textbox(slide, 'Cost', Inches(0.5), Inches(3.2), Inches(6), Inches(0.5),
+             ["Break-Funding Cost: "], 20, bold=True)
+
+    # Where the chart goes: bottom centre, 7 x 3.5 inches
+    height, width = Inches(3.5), Inches(7)
+    area = slide.shapes.add_textbox((prs.slide_width - width) // 2, prs.slide_height - height - Inches(0.3),
+                                    width, height)
+    area.name = 'Chart area'
+
+    logo_width = Inches(1.5)
+    logo = slide.shapes.add_picture(LOGO_PATH, prs.slide_width - logo_width - Inches(0.3), Inches(0.2),
+                                    width=logo_width)
+    logo.name = 'Logo'
+
+    buffer = BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=1)
+def template_bytes():
+    """
+    PPT_TEMPLATE if set, else build_template(); read once per process.
+    """
+    if PPT_TEMPLATE:
+        with open(PPT_TEMPLATE, 'rb') as f:
+            return f.read()
+    return build_template()
+
+
+def loan_details(loan):
+    """
+    Detail lines for the 'Loan Details' box, formatted like the form.
+    """
+    return [
+        f"Effective Date: {loan.get('effective_date', '')}",
+        f"Maturity Date: {loan.get('maturity_date', '')}",
+        f"Loan Rate: {loan.get('loan_rate', '')}%",
+        f"Balance: ${loan.get('balance', '')}",
+    ]
+
+
+def _set_lines(shape, lines):
+    """
+    Replace the text of the last len(lines) paragraphs, keeping each
+    paragraph's first run (and so its formatting).
+    """
+    paragraphs = shape.text_frame.paragraphs[-len(lines):]
+    for paragraph, line in zip(paragraphs, lines):
+        runs = paragraph.runs
+        if runs:
+            runs[0].text = line
+            for run in runs[1:]:
+                run._r.getparent().remove(run._r)
+        else:
+            paragraph.add_run().text = line
+
+
+class DeckBuilder:
+    """
+    Append loan slides to a copy of the template and save the deck.
+
+        deck = DeckBuilder()
+        deck.add_loan(loan, cost, chart_png)
+        pptx_bytes = deck.save()
+    """
+
+    def __init__(self):
+        self.prs = Presentation(BytesIO(template_bytes()))
+        prototype = self.prs.slides[0]
+        self._layout_part = prototype.part.slide_layout.part
+        self._shapes = [shape._element for shape in prototype.shapes if shape.name != 'Chart area']
+        # Image parts the prototype uses (the logo), shared by every slide
+        self._images = {rId: rel.target_part for rId, rel in prototype.part.rels.items() if rel.reltype == RT.IMAGE}
+        self._chart_area = next((shape for shape in prototype.shapes if shape.name == 'Chart area'), None)
+
+        self._next_image = 1 + max(
+            [part.partname.idx or 0 for part in self.prs.part.package.iter_parts()
+             if part.partname.startswith('/ppt/media/image')] or [0]
+        )
+
+        # Drop the prototype; loan slides take its place
+        slide_ids = self.prs.slides._sldIdLst
+        prototype_id = slide_ids[0]
+        self.prs.part.drop_rel(prototype_id.rId)
+        slide_ids.remove(prototype_id)
+
+        self._slide_count = 0
+        self._next_slide_id = 256
+
+    def _append_slide(self):
+        self._slide_count += 1
+        slide_part = SlidePart.new(PackURI(f"/ppt/slides/slide{self._slide_count}.xml"),
+                                   self.prs.part.package, self._layout_part)
+        rId = self.prs.part.rels._add_relationship(RT.SLIDE, slide_part)
+        self.prs.slides._sldIdLst._add_sldId(id=self._next_slide_id, rId=rId)
+        self._next_slide_id += 1
+        return slide_part.slide
+
+    def _copy_prototype(self, slide):
+        tree = slide.shapes._spTree
+        rIds = {old: slide.part.rels._add_relationship(RT.IMAGE, part) for old, part in self._images.items()}
+        for element in self._shapes:
+            element = copy.deepcopy(element)
+            for blip in element.iter(qn('a:blip')):
+                embed = blip.get(qn('r:embed'))
+                if embed in rIds:
+                    blip.set(qn('r:embed'), rIds[embed])
+            tree.append(element)
+
+    def _add_chart(self, slide, chart_png):
+        image = Image.from_blob(chart_png)
+        part = ImagePart(PackURI(f"/ppt/media/image{self._next_image}.{image.ext}"), image.content_type,
+                         self.prs.part.package, image.blob)
+        self._next_image += 1
+        rId = slide.part.rels._add_relationship(RT.IMAGE, part)
+        area = self._chart_area
+        slide.shapes._add_pic_from_image_part(part, rId, area.left, area.top, area.width, area.height)
+
+    def add_loan(self, loan, cost=None, chart_png=None, error=None):
+        """
+        One slide for `loan` (a dict of the form's fields). The cost line is
+        left out when there is neither a cost nor an error.
+        """
+        slide = self._append_slide()
+        self._copy_prototype(slide)
+        for shape in list(slide.shapes):
+            if shape.name == 'Loan Details':
+                _set_lines(shape, loan_details(loan))
+            elif shape.name == 'Cost':
+                if cost is not None:
+                    _set_lines(shape, [f"Break-Funding Cost: ${float(cost):,.2f}"])
+                elif error:
+                    _set_lines(shape, [f"Break-Funding Cost: not priced ({error})"])
+                else:
+                    shape._element.getparent().remove(shape._element)
+        if chart_png is not None and self._chart_area is not None:
+            self._add_chart(slide, chart_png)
+        return slide
+
+    def save(self):
+        buffer = BytesIO()
+        self.prs.save(buffer)
+        return buffer.getvalue()
+
+
+def loan_deck(loan, cost=None, chart_png=None):
+    """
+    Single-slide deck for one loan, as served by /download_ppt.
+    """
+    deck = DeckBuilder()
+    deck.add_loan(loan, cost, chart_png)
+    return deck.save()
+
+
+def portfolio_deck(loans, results, charts=None):
+    """
+    One slide per loan from a batch result set: `results` as returned by
+    portfolio.price_portfolio for `loans` (records). `charts` optionally
+    maps a loan's index to its chart PNG bytes.
+    """
+    deck = DeckBuilder()
+    charts = charts or {}
+    for index, (loan, cost, error) in enumerate(zip(loans, results['break_funding_cost'], results['error'])):
+        deck.add_loan(loan, None if error else cost, charts.get(index), error or None)
+    return deck.save()
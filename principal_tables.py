@@ -0,0 +1,149 @@
+"""
+Parsers for custom (sculpted) principal schedules.
+
+Every reader returns either a list of amounts (one per period) or a list of
+{'date': 'YYYY-MM-DD', 'principal': amount} rows, the two forms accepted by
+schedule.custom_principal_vector / compute_break_funding_cost(custom_principal=...).
+Negative amounts ('-100', '(100)') raise ValueError rather than being read
+as repayments.
+"""
+import csv
+import io
+import json
+import re
+
+import fitz  # PyMuPDF
+
+from loan_inputs import normalize_date, parse_amount, parse_signed_amount
+
+
+PRINCIPAL_HEADERS = ('principal', 'repayment', 'amortization', 'amortisation', 'amount')
+DATE_HEADERS = ('date',)
+
+# "2026-03-31   1,250,000.00" style lines, for PDFs without ruled tables;
+# the amount keeps a leading '-' or surrounding parentheses
+_ROW_PATTERN = re.compile(
+    r"(\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{4}|[A-Z][a-z]{2,8}\.? \d{1,2}, \d{4})"
+    r"[^\n\d$]*?(\(?-?(?:\$\s*)?-?[\d,]+(?:\.\d+)?\)?)"
+)
+
+
+def _amount(text):
+    amount = parse_signed_amount(text)
+    if amount is not None and amount < 0:
+        raise ValueError(f"Negative principal amount in the schedule: {text.strip()}")
+    return amount
+
+
+def _column(header, names):
+    for i, title in enumerate(header):
+        title = str(title or '').strip().lower()
+        if any(name in title for name in names):
+            return i
+    return None
+
+
+def _rows_from_table(header, rows):
+    """
+    Rows (lists of cells) under `header` to schedule rows. Returns None when
+    the table has no principal column.
+    """
+    principal_col = _column(header, PRINCIPAL_HEADERS)
+    if principal_col is None:
+        return None
+    date_col = _column(header, DATE_HEADERS)
+
+    schedule = []
+    for row in rows:
+        if principal_col >= len(row):
+            continue
+        amount = _amount(str(row[principal_col] or ''))
+        if amount is None:
+            continue  # subtotal or blank line
+        if date_col is None:
+            schedule.append(amount)
+            continue
+        date = normalize_date(str(row[date_col] or '')) if date_col < len(row) else ''
+        if date:
+            schedule.append({'date': date, 'principal': amount})
+    return schedule
+
+
+def read_principal_csv(text):
+    """
+    CSV with a principal/repayment column and an optional date column. A
+    single unlabeled numeric column is read as one amount per period.
+    """
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    if parse_amount(rows[0][0]) is not None and len(rows[0]) == 1:
+        return [_amount(row[0]) for row in rows]
+    schedule = _rows_from_table(rows[0], rows[1:])
+    if schedule is None:
+        raise ValueError("No principal column in the schedule")
+    return schedule
+
+
+def read_principal_json(payload):
+    """
+    A JSON list of amounts, of {'date', 'principal'} objects or of
+    [date, amount] pairs, optionally wrapped as {"schedule": [...]}.
+    """
+    if isinstance(payload, (str, bytes)):
+        payload = json.loads(payload)
+    if isinstance(payload, dict):
+        payload = payload.get('schedule', payload.get('custom_principal'))
+    if not isinstance(payload, list):
+        raise ValueError("Expected a list of principal amounts")
+    if payload and isinstance(payload[0], list):
+        payload = [{'date': str(date), 'principal': amount} for date, amount in payload]
+    for row in payload:
+        amount = row.get('principal') if isinstance(row, dict) else row
+        if isinstance(amount, (int, float)) and amount < 0:
+            raise ValueError(f"Negative principal amount in the schedule: {amount}")
+    return payload
+
+
+def extract_principal_table(path):
+    """
+    Find a repayment schedule in a PDF: the first table (detected by
+    PyMuPDF) with a principal/repayment column, else every "date ... amount"
+    line on pages that mention a repayment or amortization schedule.
+    """
+    with fitz.open(path) as doc:
+        for page in doc:
+            for table in page.find_tables().tables:
+                cells = table.extract()
+                if len(cells) < 2:
+                    continue
+                schedule = _rows_from_table(cells[0], cells[1:])
+                if schedule:
+                    return schedule
+
+        schedule = []
+        for page in doc:
+            text = page.get_text()
+            if not re.search(r"(repayment|amorti[sz]ation) schedule", text, re.IGNORECASE) and not schedule:
+                continue
+            for date_text, amount_text in _ROW_PATTERN.findall(text):
+                date = normalize_date(date_text)
+                amount = _amount(amount_text)
+                if date and amount is not None:
+                    schedule.append({'date': date, 'principal': amount})
+    return schedule
+
+
+def load_principal_table(path):
+    """
+    Read a schedule file by extension: .csv, .json or .pdf.
+    """
+    lower = str(path).lower()
+    if lower.endswith('.pdf'):
+        return extract_principal_table(path)
+    with open(path, newline='') as f:
+        text = f.read()
+    if lower.endswith('.json'):
+        return read_principal_json(text)
+    return read_principal_csv(text)
+
@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+from cache import LRUCache
+from metrics import register_cache
+
+
+# Unset keeps results in this process only; set it (e.g. .cache/results.sqlite3)
+# so every gunicorn worker can serve a calculation another worker made
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH")
+RESULT_STORE_TTL = int(os.getenv("RESULT_STORE_TTL", 3600))  # seconds a calculation is kept
+RESULT_STORE_SIZE = 256    # calculations held in memory per worker
+CHART_STORE_SIZE = 64      # rendered charts held in memory per worker
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    calc_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS charts (
+    calc_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    image BLOB NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (calc_id, name)
+);
+CREATE INDEX IF NOT EXISTS results_expires ON results (expires);
+CREATE INDEX IF NOT EXISTS charts_expires ON charts (expires);
+"""
+
+
+class ResultStore:
+    """
+    Results of a calculation (inputs, cost, schedules) and its rendered
+    charts, keyed by the calculation id handed to the page after
+    'calculate'. Downloads, chat and chart requests for that calculation
+    then look it up instead of re-reading hidden form fields and pricing or
+    rendering again.
+
+    Lookups go to an in-process LRU first, then to the optional SQLite file,
+    which (one connection per call, WAL mode) is safe to share between
+    worker processes. Entries expire after `ttl` seconds in both tiers.
+    """
+
+    def __init__(self, path=RESULT_STORE_PATH, ttl=RESULT_STORE_TTL,
+                 max_size=RESULT_STORE_SIZE, max_charts=CHART_STORE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.results = LRUCache(max_size=max_size, ttl=ttl)
+        self.charts = LRUCache(max_size=max_charts, ttl=ttl)
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def put(self, result):
+        """
+        Store a JSON-serializable result and return its new calculation id.
+        """
+        calc_id = uuid.uuid4().hex
+        self.results.put(calc_id, result)
+        if self.path:
+            now = time.time()
+            with self._connect() as conn:
+                conn.execute("INSERT INTO results (calc_id, payload, expires) VALUES (?, ?, ?)",
+                             (calc_id, json.dumps(result), now + self.ttl))
+                self._purge(conn, now)
+        return calc_id
+
+    def get(self, calc_id):
+        """
+        The stored result, or None if the id is unknown or expired.
+        """
+        if not calc_id:
+            return None
+        result = self.results.get(calc_id)
+        if result is None and self.path:
+            with self._connect() as conn:
+                row = conn.execute("SELECT payload FROM results WHERE calc_id = ? AND expires > ?",
+                                   (calc_id, time.time())).fetchone()
+            if row is not None:
+                result = json.loads(row[0])
+                self.results.put(calc_id, result)
+        return result
+
+    def put_chart(self, calc_id, name, image):
+        """
+        Keep rendered chart bytes for a stored calculation under `name`
+        (e.g. 'png@100').
+        """
+        self.charts.put((calc_id, name), image)
+        if self.path:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO charts (calc_id, name, image, expires) VALUES (?, ?, ?, ?)",
+                             (calc_id, name, image, time.time() + self.ttl))
+
+    def get_chart(self, calc_id, name):
+        image = self.charts.get((calc_id, name))
+        if image is None and self.path:
+            with self._connect() as conn:
+                row = conn.execute("SELECT image FROM charts WHERE calc_id = ? AND name = ? AND expires > ?",
+                                   (calc_id, name, time.time())).fetchone()
+            if row is not None:
+                image = bytes(row[0])
+                self.charts.put((calc_id, name), image)
+        return image
+
+    def chart(self, calc_id, name, render):
+        """
+        The stored chart `name` for `calc_id`, rendering and storing it with
+        `render()` on a miss.
+        """
+        image = self.get_chart(calc_id, name)
+        if image is None:
+            image = render()
+            self.put_chart(calc_id, name, image)
+        return image
+
+    def _purge(self, conn, now):
+        conn.execute("DELETE FROM results WHERE expires <= ?", (now,))
+        conn.execute("DELETE FROM charts WHERE expires <= ?", (now,))
+
+    def clear(self):
+        self.results.clear()
+        self.charts.clear()
+        if self.path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM results")
+                conn.execute("DELETE FROM charts")
+
+
+result_store = ResultStore()
+register_cache('results', result_store.results.info)
@@ -0,0 +1,162 @@
+import argparse
+import csv
+import datetime
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from calculations import compute_break_funding_cost
+from loan_inputs import normalize_custom_principal
+from portfolio import LOAN_COLUMNS, PRICING_OPTIONS, error_code, price_portfolio
+
+
+RESULT_COLUMNS = ['loan_id', 'break_funding_cost', 'error']
+
+
+def read_chunks(path, chunk_size):
+    """
+    Lazily yield lists of row dicts from a loan CSV, `chunk_size` rows at a time.
+    Rows without a loan_id get their 0-based line number.
+    """
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        row_number = itertools.count()
+        while True:
+            chunk = list(itertools.islice(reader, chunk_size))
+            if not chunk:
+                return
+            for row in chunk:
+                number = next(row_number)
+                if not row.get('loan_id'):
+                    row['loan_id'] = number
+            yield chunk
+
+
+def price_row(row):
+    """
+    Price one CSV row with compute_break_funding_cost.
+    Returns (cost, error) where error is an ERROR_CODES key ('' when priced).
+    """
+    try:
+        kwargs = {col: row[col] for col in LOAN_COLUMNS}
+        for col in ('loan_rate', 'balance', 'prepayment_amount'):
+            kwargs[col] = float(kwargs[col])
+    except (KeyError, TypeError, ValueError):
+        return None, 'invalid_number'
+    try:
+        for col in ('effective_date', 'maturity_date', 'prepayment_date'):
+            datetime.date.fromisoformat(kwargs[col])
+    except (TypeError, ValueError):
+        return None, 'invalid_date'
+    for col, (normalize, _, code) in PRICING_OPTIONS.items():
+        if row.get(col):
+            kwargs[col] = normalize(str(row[col]))
+            if not kwargs[col]:
+                return None, code
+    if row.get('custom_principal'):
+        kwargs['custom_principal'] = normalize_custom_principal(row['custom_principal']) or None
+        if kwargs['custom_principal'] is None:
+            return None, 'invalid_custom_schedule'
+    try:
+        return compute_break_funding_cost(**kwargs), ''
+    except Exception as e:
+        return None, error_code(e)
+
+
+def price_chunk(chunk, engine='loan'):
+    """
+    Worker entry point: price a chunk of rows and time it.
+    Returns (result rows, elapsed seconds).
+    """
+    start = time.perf_counter()
+    if engine == 'batch':
+        results = price_portfolio(chunk)
+        rows = [
+            [loan_id, '' if error else cost, error]
+            for loan_id, cost, error in zip(results['loan_id'], results['break_funding_cost'], results['error'])
+        ]
+    else:
+        rows = []
+        for row in chunk:
+            cost, error = price_row(row)
+            rows.append([row['loan_id'], '' if cost is None else cost, error])
+    return rows, time.perf_counter() - start
+
+
+def run_portfolio(input_path, output_path, workers=None, chunk_size=1000, engine='loan', log=print):
+    """
+    Price a loan CSV across a process pool and write results to `output_path`.
+
+    The input is read and submitted chunk by chunk with at most two chunks per
+    worker in flight, and results are written in input order as soon as the
+    oldest outstanding chunk finishes, so memory stays bounded by the window.
+    `engine` is 'loan' (compute_break_funding_cost per row) or 'batch'
+    (portfolio.price_portfolio per chunk).
+
+    Returns a stats dict with loan count, elapsed seconds, loans per second and
+    per-chunk (index, rows, seconds) timings.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_timings = []
+    loans = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output_path, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(RESULT_COLUMNS)
+        pending = deque()
+
+        def drain_one():
+            nonlocal loans
+            index, future = pending.popleft()
+            rows, seconds = future.result()
+            writer.writerows(rows)
+            loans += len(rows)
+            chunk_timings.append((index, len(rows), seconds))
+            if log:
+                log(f"chunk {index}: {len(rows)} loans in {seconds:.3f}s")
+
+        for index, chunk in enumerate(read_chunks(input_path, chunk_size)):
+            pending.append((index, pool.submit(price_chunk, chunk, engine)))
+            if len(pending) >= workers * 2:
+                drain_one()
+        while pending:
+            drain_one()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'loans': loans,
+        'seconds': elapsed,
+        'loans_per_sec': loans / elapsed if elapsed else 0.0,
+        'workers': workers,
+        'chunks': chunk_timings,
+    }
+    if log:
+        log(f"{loans} loans in {elapsed:.2f}s with {workers} workers "
+            f"({stats['loans_per_sec']:,.0f} loans/sec)")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price a loan CSV across multiple processes.")
+    parser.add_argument('input', help="loan CSV with the loan term and prepayment columns")
+    parser.add_argument('output', help="result CSV to write")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="loans per chunk")
+    parser.add_argument('--engine', choices=['loan', 'batch'], default='loan',
+                        help="price row by row or with the vectorized batch pricer")
+    parser.add_argument('--quiet', action='store_true', help="only print the summary line")
+    args = parser.parse_args(argv)
+
+    stats = run_portfolio(args.input, args.output, workers=args.workers,
+                          chunk_size=args.chunk_size, engine=args.engine,
+                          log=None if args.quiet else print)
+    if args.quiet:
+        print(f"{stats['loans']} loans in {stats['seconds']:.2f}s "
+              f"({stats['loans_per_sec']:,.0f} loans/sec)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+from typing import NamedTuple
+
+import matplotlib.ticker as mtick
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from calculations import get_schedule
+from curves import default_curve
+from schedule import parse_date, round_cents
+
+
+DEFAULT_NUM_DATES = 24
+DEFAULT_FRACTIONS = (0.25, 0.5, 1.0)
+
+
+class ScenarioGrid(NamedTuple):
+    """
+    Break-funding costs for every (prepayment date, amount) pair.
+
+    costs and amounts are (dates x scenarios) arrays. Columns are fractions of
+    the principal outstanding at each date, or fixed amounts. Cells whose
+    amount exceeds the outstanding principal are NaN.
+    """
+    prepayment_dates: np.ndarray
+    amounts: np.ndarray
+    costs: np.ndarray
+    labels: list
+    outstanding: np.ndarray
+
+
+def scenario_dates(data, num_dates=DEFAULT_NUM_DATES, start=None):
+    """
+    The next `num_dates` period start dates on or after `start` (default: the
+    loan's prepayment date if given, else its effective date).
+    """
+    schedule = get_schedule(data)
+    start = start or data.get('prepayment_date') or data['effective_date']
+    first = int(np.searchsorted(schedule.period_starts, parse_date(start), side='left'))
+    return schedule.period_starts[first:first + num_dates]
+
+
+def prepayment_grid(data, prepayment_dates=None, fractions=None, amounts=None,
+                    num_dates=DEFAULT_NUM_DATES, curve=None):
+    """
+    Evaluate compute_break_funding_cost over a grid of prepayment dates and
+    amounts in one vectorized pass.
+
+    The original schedule is built once. For each date, the backloaded
+    principal reduction for every amount comes from a reverse cumulative
+    sum of the outstanding principal instead of the per-period loop.
+    Give either `fractions` of the outstanding principal (default 25/50/100%)
+    or absolute `amounts`. Dates default to scenario_dates(data, num_dates).
+    """
+    if fractions is not None and amounts is not None:
+        raise ValueError("Give either fractions or amounts, not both")
+    schedule = get_schedule(data)
+    num_periods = schedule.num_periods
+    curve = curve or default_curve()
+
+    if prepayment_dates is None:
+        prepayment_dates = scenario_dates(data, num_dates)
+    prepayment_dates = np.array([parse_date(d) for d in prepayment_dates], dtype='datetime64[D]')
+    if len(prepayment_dates) == 0:
+        raise ValueError("No prepayment dates before maturity")
+
+    prepay_index = np.searchsorted(schedule.period_starts, prepayment_dates, side='left')
+    if (prepay_index == num_periods).any():
+        raise ValueError("Prepayment date is beyond loan maturity.")
+
+    principal = schedule.principal
+    interest = schedule.interest
+    after_prepay = np.arange(num_periods) >= prepay_index[:, None]
+    remaining = np.where(after_prepay, principal, 0.0)  # dates x periods
+    # Summed left to right (like the scalar engine) so 100% is never "exceeds"
+    outstanding = np.cumsum(remaining, axis=1)[:, -1]
+
+    if amounts is not None:
+        amounts = np.broadcast_to(np.asarray(amounts, dtype=float), (len(prepayment_dates), len(amounts)))
+        labels = [f"${a:,.0f}" for a in amounts[0]]
+    else:
+        fractions = np.asarray(DEFAULT_FRACTIONS if fractions is None else fractions, dtype=float)
+        amounts = outstanding[:, None] * fractions
+        labels = [f"{f:.0%}" for f in fractions]
+
+    # Backload each amount: the last periods are reduced first
+    later = np.cumsum(remaining[:, ::-1], axis=1)[:, ::-1] - remaining
+    reduction = np.clip(amounts[:, :, None] - later[:, None, :], 0.0, remaining[:, None, :])
+
+    # One cached discount-factor lookup per date
+    discount_factors = np.stack([
+        curve.discount_factors(d, schedule.months_per_period, num_periods) for d in prepayment_dates
+    ])
+    pv_original = ((principal + interest) * discount_factors).sum(axis=1)
+    pv_adjusted = ((principal + interest - reduction) * discount_factors[:, None, :]).sum(axis=2)
+    costs = round_cents(pv_original[:, None] - pv_adjusted)
+    costs[amounts > outstanding[:, None]] = np.nan
+
+    return ScenarioGrid(prepayment_dates, amounts, costs, labels, outstanding)
+
+
+def build_scenario_heatmap(grid, figsize=(12, 9)):
+    """
+    Heatmap of a ScenarioGrid (dates down, amounts across) on a standalone
+    Agg-backed Figure. Call inside CHART_STYLE's rc_context like the
+    cashflow chart.
+    """
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    costs = np.ma.masked_invalid(grid.costs)
+    image = ax.imshow(costs, aspect='auto', cmap='YlOrRd', interpolation='nearest')
+    colorbar = fig.colorbar(image, ax=ax, format=mtick.StrMethodFormatter('${x:,.0f}'))
+    colorbar.set_label("Break-Funding Cost ($)", fontsize=14)
+
+    ax.set_xticks(range(len(grid.labels)))
+    ax.set_xticklabels(grid.labels, fontsize=12)
+    ax.set_yticks(range(len(grid.prepayment_dates)))
+    ax.set_yticklabels(np.datetime_as_string(grid.prepayment_dates, unit='D'), fontsize=10)
+    ax.set_xlabel("Prepayment Amount", fontsize=14, weight='bold')
+    ax.set_ylabel("Prepayment Date", fontsize=14, weight='bold')
+    ax.grid(False)
+
+    # Annotate cells when the grid is small enough to read
+    if costs.size <= 120:
+        for (row, col), cost in np.ndenumerate(grid.costs):
+            if not np.isnan(cost):
+                ax.text(col, row, f"${cost:,.0f}", ha='center', va='center', fontsize=8)
+
+    fig.tight_layout(pad=2.0)
+    return fig
@@ -0,0 +1,438 @@
+import datetime
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from calendars import DAY_COUNTS, modified_following, year_fractions
+
+
+FREQ_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'semiannual': 6,
+    'annual': 12
+}
+
+AMORTIZATION_TYPES = ('interest only', 'equal', 'linear', 'custom')
+
+# A custom schedule that does not fit the loan (one message so batch
+# callers can map it to a single error code)
+CUSTOM_SCHEDULE_ERROR = "Custom principal schedule must have one non-negative amount per period summing to the balance"
+CUSTOM_SCHEDULE_MISSING = "Custom amortization needs a principal schedule"
+
+# How a partial prepayment changes the remaining schedule. 'backload' (the
+# original behaviour) removes principal from the last periods and leaves
+# interest as scheduled; the other two re-amortize the reduced balance.
+PREPAYMENT_MODES = ('backload', 'reduce_installment', 'shorten_term')
+
+
+class Schedule(NamedTuple):
+    """
+    Array-based loan schedule.
+
+    payment_dates holds the period boundaries as datetime64[D] (num_periods + 1
+    entries, the last one being the maturity date). principal and interest hold
+    one rounded amount per period.
+    """
+    payment_dates: np.ndarray
+    principal: np.ndarray
+    interest: np.ndarray
+    months_per_period: int
+    period_rate: float
+
+    @property
+    def num_periods(self):
+        return len(self.principal)
+
+    @property
+    def period_starts(self):
+        return self.payment_dates[:-1]
+
+
+def parse_date(value):
+    """
+    Convert a 'YYYY-MM-DD' string, date or datetime into numpy datetime64[D].
+    """
+    if isinstance(value, str):
+        value = datetime.datetime.strptime(value, "%Y-%m-%d")
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+def months_per_period(frequency):
+    frequency = frequency.lower()
+    if frequency not in FREQ_MONTHS:
+        raise ValueError("Invalid frequency")
+    return FREQ_MONTHS[frequency]
+
+
+def round_cents(values):
+    """
+    Round to 2 decimals exactly like Python's round(x, 2).
+
+    np.round scales by 100 before rounding, which disagrees with the builtin on
+    values sitting next to a half-cent boundary. Those few entries are
+    re-rounded with the builtin so results match the scalar code bit for bit.
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for idx in np.flatnonzero(near_half):
+        rounded.flat[idx] = round(float(values.flat[idx]), 2)
+    return rounded
+
+
+def date_grid(start, count, step_months):
+    """
+    Return `count` dates starting at `start`, `step_months` apart.
+
+    Mirrors repeatedly adding relativedelta(months=step) to the previous date:
+    once the day of month is clipped (e.g. 31 Jan -> 28 Feb) it stays clipped,
+    so the day for period k is the minimum month length seen so far.
+    """
+    start = parse_date(start)
+    start_month = start.astype('datetime64[M]')
+    start_day = (start - start_month.astype('datetime64[D]')).astype(int) + 1
+
+    months = start_month + np.arange(count) * step_months
+    if count == 0:
+        return months.astype('datetime64[D]')
+    month_starts = months.astype('datetime64[D]')
+    month_lengths = ((months + 1).astype('datetime64[D]') - month_starts).astype(int)
+    month_lengths[0] = start_day
+    days = np.minimum(start_day, np.minimum.accumulate(month_lengths))
+    return month_starts + (days - 1)
+
+
+def payment_date_grid(effective_date, maturity_date, step_months):
+    """
+    Period boundaries from effective to maturity date; the final (possibly
+    short) period ends on the maturity date.
+    """
+    start = parse_date(effective_date)
+    end = parse_date(maturity_date)
+    total_months = (end.astype('datetime64[M]') - start.astype('datetime64[M]')).astype(int)
+    grid = date_grid(start, max(total_months // step_months + 2, 1), step_months)
+    num_periods = int(np.searchsorted(grid, end, side='left'))
+    return np.append(grid[:num_periods], end)
+
+
+@lru_cache(maxsize=4096)
+def _cached_payment_dates(effective_date, maturity_date, step_months, calendar):
+    dates = payment_date_grid(effective_date, maturity_date, step_months)
+    if calendar:
+        # Roll payment dates (not the effective date) to business days
+        dates[1:] = modified_following(dates[1:], calendar)
+    dates.setflags(write=False)
+    return dates
+
+
+def payment_dates(effective_date, maturity_date, step_months, calendar=None):
+    """
+    payment_date_grid, optionally rolled modified-following on a holiday
+    calendar from calendars.load_calendar. Grids are built once per
+    (dates, frequency, calendar) and shared read-only.
+    """
+    return _cached_payment_dates(parse_date(effective_date), parse_date(maturity_date),
+                                 int(step_months), calendar or None)
+
+
+def add_months(dates, months):
+    """
+    Add a month offset to each date without accumulating day clipping, i.e.
+    date + relativedelta(months=n) for every (date, n) pair. Broadcasts.
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    start_month = dates.astype('datetime64[M]')
+    start_day = (dates - start_month.astype('datetime64[D]')).astype(int) + 1
+    target = start_month + np.asarray(months)
+    month_starts = target.astype('datetime64[D]')
+    month_lengths = ((target + 1).astype('datetime64[D]') - month_starts).astype(int)
+    return month_starts + (np.minimum(start_day, month_lengths) - 1)
+
+
+def principal_interest_matrix(balance, period_rate, num_periods, amortization, custom_principal=None):
+    """
+    Closed-form unrounded principal and interest for a batch of loans sharing
+    the same number of periods.
+
+    balance, period_rate and amortization are 1-D arrays with one entry per
+    loan; amortization holds the type names. 'custom' rows take their
+    principal from the matching row of `custom_principal` (loans x periods,
+    see custom_principal_vector). Returns two (loans, num_periods) arrays.
+    Rows with an unknown type, or custom rows without a schedule, are left
+    as NaN.
+    """
+    balance = np.asarray(balance, dtype=float)[:, None]
+    period_rate = np.asarray(period_rate, dtype=float)[:, None]
+    amortization = np.asarray(amortization, dtype=object)
+    periods = np.arange(num_periods)
+
+    shape = (len(balance), num_periods)
+    principal = np.full(shape, np.nan)
+    interest = np.full(shape, np.nan)
+
+    rows = amortization == "interest only"
+    if rows.any():
+        interest[rows] = np.broadcast_to(balance[rows] * period_rate[rows], (rows.sum(), num_periods))
+        principal[rows] = 0.0
+        if num_periods:
+            principal[rows, -1] = balance[rows, 0]
+
+    rows = amortization == "equal"
+    if rows.any():
+        b, r = balance[rows], period_rate[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            annuity_payment = np.where(
+                r == 0,
+                b / num_periods,
+                b * (r / (1 - (1 + r) ** -num_periods)),
+            )
+            growth = (1 + r) ** periods
+            outstanding = np.where(
+                r == 0,
+                b - annuity_payment * periods,
+                b * growth - annuity_payment * (growth - 1) / r,
+            )
+        interest[rows] = outstanding * r
+        principal[rows] = annuity_payment - interest[rows]
+
+    rows = amortization == "linear"
+    if rows.any():
+        b, r = balance[rows], period_rate[rows]
+        principal_payment = b / num_periods
+        # cumsum is sequential, so this reproduces `balance -= principal_payment`
+        steps = np.broadcast_to(-principal_payment, (len(b), num_periods)).copy()
+        steps[:, 0] = b[:, 0]
+        outstanding = np.cumsum(steps, axis=1)
+        interest[rows] = outstanding * r
+        principal[rows] = np.broadcast_to(principal_payment, (len(b), num_periods))
+
+    rows = amortization == "custom"
+    if custom_principal is not None and rows.any():
+        scheduled = np.asarray(custom_principal, dtype=float)[rows]
+        interest[rows] = custom_outstanding(balance[rows], scheduled) * period_rate[rows]
+        principal[rows] = scheduled
+
+    return principal, interest
+
+
+def custom_outstanding(balance, principal):
+    """
+    Balance outstanding at the start of each period of a custom schedule,
+    for one loan (1-D) or a batch (rows). Summed sequentially.
+    """
+    principal = np.asarray(principal, dtype=float)
+    steps = -np.roll(principal, 1, axis=-1)
+    steps[..., 0] = np.asarray(balance, dtype=float).reshape(steps[..., 0].shape)
+    return np.cumsum(steps, axis=-1)
+
+
+def custom_principal_vector(table, dates, balance):
+    """
+    Validate a custom principal schedule against a loan and return one
+    amount per period.
+
+    `table` is either a plain sequence of amounts (one per period) or a
+    sequence of dated rows ({'date': ..., 'principal': ...} or (date, amount)
+    pairs); dated amounts are added to the period whose end date is the
+    first on or after the row's date. `dates` is the loan's payment-date
+    grid. Amounts must be finite, non-negative and sum to the balance within
+    a cent per row.
+    """
+    num_periods = len(dates) - 1
+    rows = list(table)
+    try:
+        if rows and isinstance(rows[0], dict):
+            row_dates = np.array([str(r['date']) for r in rows], dtype='datetime64[D]')
+            amounts = np.array([r['principal'] for r in rows], dtype=float)
+        elif rows and isinstance(rows[0], (list, tuple)):
+            row_dates = np.array([str(r[0]) for r in rows], dtype='datetime64[D]')
+            amounts = np.array([r[1] for r in rows], dtype=float)
+        else:
+            row_dates = None
+            amounts = np.array(rows, dtype=float)
+    except (KeyError, IndexError, TypeError, ValueError):
+        raise ValueError(CUSTOM_SCHEDULE_ERROR)
+
+    if row_dates is not None:
+        period = np.searchsorted(dates[1:], row_dates, side='left')
+        if (period >= num_periods).any() or (row_dates <= dates[0]).any():
+            raise ValueError(CUSTOM_SCHEDULE_ERROR)
+        amounts = np.bincount(period, weights=amounts, minlength=num_periods)
+
+    if (amounts.ndim != 1 or len(amounts) != num_periods or not np.isfinite(amounts).all()
+            or (amounts < 0).any() or abs(amounts.sum() - balance) > 0.01 * max(num_periods, 1)):
+        raise ValueError(CUSTOM_SCHEDULE_ERROR)
+    return amounts
+
+
+def principal_interest(balance, period_rate, num_periods, amortization, custom_principal=None):
+    """
+    Closed-form unrounded principal and interest vectors for a single loan.
+    Custom loans need their validated per-period `custom_principal`.
+    """
+    if amortization not in AMORTIZATION_TYPES:
+        raise ValueError("Unknown amortization type")
+    if amortization == "custom" and custom_principal is None:
+        raise ValueError(CUSTOM_SCHEDULE_MISSING)
+
+    custom = None if custom_principal is None else [custom_principal]
+    principal, interest = principal_interest_matrix([balance], [period_rate], num_periods, [amortization], custom)
+    return principal[0], interest[0]
+
+
+def accrued_principal_interest(balance, annual_rate, accruals, period_rate, amortization, custom_principal=None):
+    """
+    Unrounded principal and interest when each period accrues interest over
+    its own year fraction (`accruals`) instead of a fixed period rate.
+
+    Equal-payment loans keep the level installment computed at the nominal
+    `period_rate`; principal is what the installment leaves after the actual
+    interest, and the final period repays whatever balance remains.
+    """
+    if amortization not in AMORTIZATION_TYPES:
+        raise ValueError("Unknown amortization type")
+    if amortization == "custom" and custom_principal is None:
+        raise ValueError(CUSTOM_SCHEDULE_MISSING)
+
+    accruals = np.asarray(accruals, dtype=float)
+    rates = annual_rate * accruals
+    num_periods = len(accruals)
+    if num_periods == 0:
+        return np.zeros(0), np.zeros(0)
+
+    if amortization == "interest only":
+        principal = np.zeros(num_periods)
+        principal[-1] = balance
+        return principal, balance * rates
+
+    if amortization == "custom":
+        principal = np.asarray(custom_principal, dtype=float)
+        return principal, custom_outstanding(balance, principal) * rates
+
+    if amortization == "linear":
+        principal_payment = balance / num_periods
+        steps = np.full(num_periods, -principal_payment)
+        steps[0] = balance
+        outstanding = np.cumsum(steps)
+        return np.full(num_periods, principal_payment), outstanding * rates
+
+    # Equal: B[k+1] = B[k] (1 + r[k]) - P, i.e. B[k] = G[k] (B[0] - P sum_{j<=k} 1 / G[j])
+    payment = balance / num_periods if period_rate == 0 else balance * period_rate / (1 - (1 + period_rate) ** -num_periods)
+    growth = np.concatenate(([1.0], np.cumprod(1 + rates[:-1])))
+    paid = np.concatenate(([0.0], np.cumsum(1 / growth[1:])))
+    outstanding = growth * (balance - payment * paid)
+    interest = outstanding * rates
+    principal = payment - interest
+    principal[-1] = outstanding[-1]
+    return principal, interest
+
+
+def reamortize(principal, interest, prepay_index, prepayment_amount, period_rate, amortization, mode):
+    """
+    Re-amortize a schedule after a prepayment made at the start of period
+    `prepay_index`. Only the tail from that period onward is recomputed;
+    earlier periods are returned unchanged.
+
+    'reduce_installment' keeps the maturity and spreads the reduced balance
+    over the remaining periods with the same amortization type.
+    'shorten_term' keeps the installment (level payment for 'equal', the
+    per-period principal for 'linear') so the loan pays off early.
+    Custom schedules keep their profile: scaled down to the reduced balance,
+    or paid as scheduled until the balance runs out.
+    Interest-only loans keep paying interest on the reduced balance in
+    both modes. Interest is always recomputed on the reduced balance.
+    """
+    if mode not in PREPAYMENT_MODES or mode == 'backload':
+        raise ValueError("Unknown prepayment mode")
+    if amortization not in AMORTIZATION_TYPES:
+        raise ValueError("Unknown amortization type")
+    principal = np.array(principal, dtype=float)
+    interest = np.array(interest, dtype=float)
+    remaining_periods = len(principal) - prepay_index
+    balance = sum(principal[prepay_index:].tolist()) - prepayment_amount
+
+    if amortization == 'custom':
+        scheduled = principal[prepay_index:]
+        if mode == 'reduce_installment':
+            total = scheduled.sum()
+            tail_principal = scheduled * (balance / total) if total else scheduled
+        else:
+            repaid = np.minimum(np.cumsum(scheduled), balance)
+            repaid[-1] = balance
+            tail_principal = np.diff(repaid, prepend=0.0)
+        tail_interest = custom_outstanding(balance, tail_principal) * period_rate
+    elif mode == 'reduce_installment' or amortization == 'interest only':
+        tail_principal, tail_interest = principal_interest(balance, period_rate, remaining_periods, amortization)
+    elif amortization == 'equal':
+        # Same level payment on a smaller balance: B_j = B(1+r)^j - P((1+r)^j - 1)/r
+        payment = principal[prepay_index] + interest[prepay_index]
+        periods = np.arange(remaining_periods + 1)
+        if period_rate == 0:
+            outstanding = balance - payment * periods
+        else:
+            growth = (1 + period_rate) ** periods
+            outstanding = balance * growth - payment * (growth - 1) / period_rate
+        outstanding = np.maximum(outstanding, 0.0)
+        outstanding[-1] = 0.0  # anything left is repaid at maturity
+        tail_principal = outstanding[:-1] - outstanding[1:]
+        tail_interest = outstanding[:-1] * period_rate
+    else:
+        # Linear: same principal per period until the smaller balance runs out
+        repaid = np.minimum(principal[prepay_index] * np.arange(1, remaining_periods + 1), balance)
+        repaid[-1] = balance
+        tail_principal = np.diff(repaid, prepend=0.0)
+        tail_interest = (balance - (repaid - tail_principal)) * period_rate
+
+    principal[prepay_index:] = round_cents(tail_principal)
+    interest[prepay_index:] = round_cents(tail_interest)
+    return principal, interest
+
+
+def build_schedule(data):
+    """
+    Build the original loan schedule from the same dict accepted by
+    calculations.compute_original_cashflow. Optional 'day_count' (one of
+    calendars.DAY_COUNTS, default 'periodic') and 'calendar' (holiday
+    calendar name for modified-following payment dates) refine accrual.
+    Custom loans take their principal from 'custom_principal' (see
+    custom_principal_vector).
+    """
+    balance = data['balance']
+    annual_rate = data['loan_rate'] / 100
+    amortization = data['amortization_type'].lower()
+    step = months_per_period(data['frequency'])
+    day_count = data.get('day_count') or 'periodic'
+    if day_count not in DAY_COUNTS:
+        raise ValueError(f"Unknown day count: {day_count}")
+
+    dates = payment_dates(data['effective_date'], data['maturity_date'], step, data.get('calendar'))
+    num_periods = len(dates) - 1
+    if num_periods == 0 and amortization in ("equal", "linear"):
+        raise ValueError("Maturity date must be after effective date")
+
+    custom = None
+    if amortization == "custom":
+        if data.get('custom_principal') is None:
+            raise ValueError(CUSTOM_SCHEDULE_MISSING)
+        custom = custom_principal_vector(data['custom_principal'], dates, balance)
+
+    period_rate = annual_rate * step / 12
+    if day_count == 'periodic':
+        principal, interest = principal_interest(balance, period_rate, num_periods, amortization, custom)
+    else:
+        accruals = year_fractions(dates[:-1], dates[1:], day_count)
+        principal, interest = accrued_principal_interest(balance, annual_rate, accruals, period_rate,
+                                                         amortization, custom)
+
+    return Schedule(
+        payment_dates=dates,
+        principal=round_cents(principal),
+        interest=round_cents(interest),
+        months_per_period=step,
+        period_rate=period_rate,
+    )
@@ -0,0 +1,93 @@
+"""
+LLMGateway against llm_stub_server: retries, coalescing, deadlines and the
+pending-call bound, with no network access.
+
+    python -m unittest test_llm_client
+"""
+import threading
+import time
+import unittest
+
+from huggingface_hub import InferenceClient
+
+from llm_client import LLMGateway, LLMOverloadedError, LLMTimeoutError
+from llm_stub_server import DEFAULT_REPLY, start_stub_server
+
+
+MESSAGES = [{'role': 'user', 'content': "What is FTP?"}]
+
+
+class GatewayTest(unittest.TestCase):
+
+    def start(self, **stub_options):
+        server, url = start_stub_server(**stub_options)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.handler = server.RequestHandlerClass
+        return InferenceClient(base_url=url, token='stub', timeout=5)
+
+    def gateway(self, client, **options):
+        gateway = LLMGateway(client, backoff=0.01, **options)
+        self.addCleanup(gateway._executor.shutdown, wait=True)
+        return gateway
+
+    def test_retries_transient_failures(self):
+        gateway = self.gateway(self.start(fail_first=2), max_retries=2)
+        self.assertEqual(gateway.chat(MESSAGES), DEFAULT_REPLY)
+        self.assertEqual(self.handler.requests_seen, 3)
+
+    def test_gives_up_after_max_retries(self):
+        gateway = self.gateway(self.start(fail_first=10), max_retries=1)
+        with self.assertRaises(Exception):
+            gateway.chat(MESSAGES)
+        self.assertEqual(self.handler.requests_seen, 2)
+
+    def test_coalesces_identical_requests(self):
+        gateway = self.gateway(self.start(delay=0.3))
+        answers = []
+        threads = [threading.Thread(target=lambda: answers.append(gateway.chat(MESSAGES))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(answers, [DEFAULT_REPLY] * 5)
+        self.assertEqual(self.handler.requests_seen, 1)
+        self.assertEqual((gateway.calls, gateway.coalesced), (1, 4))
+
+    def test_deadline(self):
+        gateway = self.gateway(self.start(delay=1.0))
+        start = time.perf_counter()
+        with self.assertRaises(LLMTimeoutError):
+            gateway.chat(MESSAGES, deadline=0.2)
+        self.assertLess(time.perf_counter() - start, 0.8)
+
+    def test_timed_out_queued_call_is_cancelled(self):
+        gateway = self.gateway(self.start(delay=0.5), max_concurrency=1)
+        running = gateway.submit(MESSAGES)
+        with self.assertRaises(LLMTimeoutError):
+            gateway.chat([{'role': 'user', 'content': "What is break-funding?"}], deadline=0.1)
+        self.assertEqual(gateway.cancelled, 1)
+        self.assertEqual(running.result(timeout=5), DEFAULT_REPLY)
+        gateway._executor.shutdown(wait=True)
+        self.assertEqual(self.handler.requests_seen, 1)
+
+    def test_abandoned_call_is_not_retried(self):
+        gateway = self.gateway(self.start(delay=0.3, fail_first=1), max_retries=2)
+        with self.assertRaises(LLMTimeoutError):
+            gateway.chat(MESSAGES, deadline=0.1)
+        gateway._executor.shutdown(wait=True)
+        self.assertEqual(self.handler.requests_seen, 1)
+
+    def test_rejects_when_pending_calls_are_full(self):
+        gateway = self.gateway(self.start(delay=0.3), max_concurrency=1, max_pending=2)
+        first = gateway.submit(MESSAGES)
+        gateway.submit([{'role': 'user', 'content': "What is SOFR?"}])
+        with self.assertRaises(LLMOverloadedError):
+            gateway.submit([{'role': 'user', 'content': "What is DV01?"}])
+        # Joining a pending call takes no new slot
+        self.assertIs(gateway.submit(MESSAGES), first)
+        self.assertEqual(gateway.rejected, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()